@@ -0,0 +1,141 @@
+import time
+from typing import List, Optional
+
+import numpy as np
+
+# Samples are normalised to [-1.0, 1.0] before metering
+SAMPLE_SCALE = {
+    "s16": 32768.0,
+    "s16p": 32768.0,
+    "s32": 2147483648.0,
+    "s32p": 2147483648.0,
+}
+
+FFT_SIZE = 1024
+FLOOR_DB = -90.0
+
+
+def frame_to_mono(frame) -> np.ndarray:
+    """Downmix an av.AudioFrame to a mono float32 array in [-1.0, 1.0]"""
+    samples = frame.to_ndarray()
+    channels = len(frame.layout.channels)
+    if frame.format.is_planar:
+        mono = samples.mean(axis=0, dtype=np.float32)
+    else:
+        mono = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    scale = SAMPLE_SCALE.get(frame.format.name)
+    if scale:
+        mono /= scale
+    return mono
+
+
+def band_edges(sample_rate: int, bands: int, low_hz: float = 60.0) -> np.ndarray:
+    """Log-spaced FFT bin indices splitting low_hz..nyquist into ``bands``"""
+    freqs = np.geomspace(low_hz, sample_rate / 2, bands + 1)
+    edges = np.round(freqs / sample_rate * FFT_SIZE).astype(np.int64)
+    edges = np.clip(edges, 1, FFT_SIZE // 2)
+    # Guarantee at least one bin per band at low sample rates
+    return np.maximum(edges[:-1], np.arange(1, bands + 1))
+
+
+class AudioMeter:
+    """Per-stream level and spectrum meter.
+
+    Frames are accumulated and measured in one batch every ``1 / rate_hz``
+    seconds, so the cost per incoming frame is a single array copy.
+    """
+
+    def __init__(self, bands: int = 8, rate_hz: float = 15.0):
+        self.bands = bands
+        self.interval = 1.0 / rate_hz
+        self.pending: List[np.ndarray] = []
+        self.sample_rate = 48000
+        self.last_emit = time.monotonic()
+        self._edges = None
+        self._window = np.hanning(FFT_SIZE).astype(np.float32)
+
+    def add(self, frame, samples: np.ndarray = None) -> Optional[dict]:
+        """Feed one frame (optionally already downmixed); returns a level
+        report when one is due"""
+        if frame.sample_rate != self.sample_rate:
+            self.sample_rate = frame.sample_rate
+            self._edges = None
+        self.pending.append(frame_to_mono(frame) if samples is None else samples)
+
+        now = time.monotonic()
+        if now - self.last_emit < self.interval:
+            return None
+        # Advance on a fixed grid so the average rate matches rate_hz
+        self.last_emit = max(self.last_emit + self.interval, now - self.interval)
+
+        samples = np.concatenate(self.pending)
+        self.pending.clear()
+        return self.measure(samples)
+
+    def measure(self, samples: np.ndarray) -> dict:
+        if samples.size == 0:
+            return {"rms": FLOOR_DB, "peak": FLOOR_DB, "bands": [0] * self.bands}
+
+        rms = float(np.sqrt(np.mean(np.square(samples))))
+        peak = float(np.max(np.abs(samples)))
+
+        # Spectrum over the most recent FFT_SIZE samples
+        tail = samples[-FFT_SIZE:]
+        if tail.size < FFT_SIZE:
+            tail = np.pad(tail, (FFT_SIZE - tail.size, 0))
+        magnitude = np.abs(np.fft.rfft(tail * self._window)) / (FFT_SIZE / 4)
+
+        if self._edges is None:
+            self._edges = band_edges(self.sample_rate, self.bands)
+        band_power = np.maximum.reduceat(magnitude, self._edges)
+        band_db = 20 * np.log10(np.maximum(band_power, 1e-9))
+        band_levels = np.clip((band_db - FLOOR_DB) * (255 / -FLOOR_DB), 0, 255)
+
+        return {
+            "rms": round(to_db(rms), 1),
+            "peak": round(to_db(peak), 1),
+            "bands": band_levels.astype(np.uint8).tolist(),
+        }
+
+
+class VoiceActivityGate:
+    """Energy gate deciding whether a stream is carrying speech.
+
+    A frame whose RMS reaches ``threshold_db`` opens the gate. It closes again
+    once no frame has reached ``threshold_db - hysteresis_db`` for ``hangover``
+    seconds, so pauses between words do not toggle it. Streams start open.
+    """
+
+    def __init__(
+        self,
+        threshold_db: float = -45.0,
+        hangover: float = 0.8,
+        hysteresis_db: float = 6.0,
+    ):
+        self.open_power = 10 ** (threshold_db / 10)
+        self.hold_power = 10 ** ((threshold_db - hysteresis_db) / 10)
+        self.hangover = hangover
+        self.active = True
+        self.last_voice = time.monotonic()
+
+    def update(self, samples: np.ndarray) -> bool:
+        """Feed one frame of mono samples; returns True if ``active`` changed"""
+        if samples.size == 0:
+            return False
+        power = float(np.dot(samples, samples)) / samples.size
+        now = time.monotonic()
+        if power >= (self.hold_power if self.active else self.open_power):
+            self.last_voice = now
+            if not self.active:
+                self.active = True
+                return True
+        elif self.active and now - self.last_voice > self.hangover:
+            self.active = False
+            return True
+        return False
+
+
+def to_db(value: float) -> float:
+    if value <= 0:
+        return FLOOR_DB
+    return max(FLOOR_DB, float(20 * np.log10(value)))
@@ -1,10 +1,18 @@
 import asyncio
-import fractions
 import logging
 import os
+import time
+from typing import Dict, Tuple
 
-import av
-from aiohttp import web
+from aiohttp import WSCloseCode, web
+
+from encoder_pool import EncoderPool
+from handoff import bind_socket
+from hls import HlsSegmenter
+from pcm_tap import TAP_SAMPLE_RATES, SharedTap
+from recorder import RecordingWriter, StreamRecorder
+from replay import ReplayBuffer, parse_replay_time
+from stream_encoder import BACKPRESSURE_POLICIES, CODECS, Mp3Codec, SharedEncoder
 
 logger = logging.getLogger(__name__)
 
@@ -17,14 +25,67 @@ class AudioStreamServer:
         self.app.router.add_get("/stream/latest.mp3", self.latest_stream_handler)
         self.app.router.add_get("/stream/{stream_id}.mp3", self.stream_handler)
         self.app.router.add_get("/stream/status", self.status_handler)
+        self.app.router.add_get(
+            "/stream/{stream_id}/index.m3u8", self.hls_playlist_handler
+        )
+        self.app.router.add_get(
+            r"/stream/{stream_id}/{sequence:\d+}.aac", self.hls_segment_handler
+        )
+        self.app.router.add_get("/stream/{stream_id}/replay.mp3", self.replay_handler)
+        self.app.router.add_get("/tap/{stream_id}", self.tap_handler)
+        self.encoders: Dict[Tuple[str, str], SharedEncoder] = {}
+        self.segmenters: Dict[str, HlsSegmenter] = {}
+        self.taps: Dict[Tuple[str, int, int], SharedTap] = {}
+        self.hls_segment_seconds = float(os.environ.get("HLS_SEGMENT_SECONDS", 1.0))
+        self.hls_segments = int(os.environ.get("HLS_SEGMENTS", 6))
+        self.listener_queue_packets = int(
+            os.environ.get("LISTENER_QUEUE_PACKETS", 256)
+        )
+        self.listener_backpressure = os.environ.get(
+            "LISTENER_BACKPRESSURE", "drop_oldest"
+        )
+        self.listener_max_lag = float(os.environ.get("LISTENER_MAX_LAG", 5.0))
+        self.prebuffer_ms = int(os.environ.get("PREBUFFER_MS", 1000))
+        self.prebuffer_max_bytes = int(os.environ.get("PREBUFFER_MAX_BYTES", 262144))
+        # Encoding before the first listener costs one MP3 encode per stream
+        self.prewarm_encoders = os.environ.get("PREWARM", "false").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        self.max_profiles = int(os.environ.get("MAX_STREAM_PROFILES", 4))
+        self.record = os.environ.get("RECORD", "false").lower() in ("1", "true", "yes")
+        self.record_format = os.environ.get("RECORD_FORMAT", "mp3").lower()
+        if self.record_format not in CODECS:
+            logger.error(
+                f"Unknown RECORD_FORMAT {self.record_format!r} "
+                f"(expected one of {', '.join(CODECS)}), recording as mp3"
+            )
+            self.record_format = "mp3"
+        self.recorders: Dict[str, StreamRecorder] = {}
+        self.replay_seconds = float(os.environ.get("REPLAY_SECONDS", 0))
+        self.replays: Dict[str, ReplayBuffer] = {}
+        retention_hours = float(os.environ.get("RECORD_RETENTION_HOURS", 24))
+        self.record_writer = RecordingWriter(
+            os.environ.get("RECORD_DIR", "recordings"),
+            segment_seconds=float(os.environ.get("RECORD_SEGMENT_SECONDS", 300)),
+            retention_seconds=retention_hours * 3600,
+            max_bytes=int(os.environ.get("RECORD_MAX_MB", 1024)) << 20,
+        )
+        self.encoder_pool = EncoderPool(
+            mode=os.environ.get("ENCODER_EXECUTOR", "thread"),
+            workers=int(os.environ.get("ENCODER_WORKERS", 2)),
+        )
         self.runner = None
         self.site = None
+        self.sock = None
 
     async def health_check(self, request):
         return web.Response(text="OK")
 
     async def latest_stream_handler(self, request):
-        if not self.relay_server.active_streams:
+        stream_id = self.relay_server.latest_stream_id()
+        if not stream_id:
             html_content = """
             <!DOCTYPE html>
             <html>
@@ -115,50 +176,472 @@ class AudioStreamServer:
             """
             return web.Response(text=html_content, content_type="text/html")
 
-        # Get latest stream (last inserted key)
-        stream_id = list(self.relay_server.active_streams.keys())[-1]
-
         # Delegate to stream_handler
         request.match_info["stream_id"] = stream_id
         return await self.stream_handler(request)
 
-    async def start(self, host="0.0.0.0", port=None, ssl_context=None):
-        if port is None:
-            port = int(os.environ.get("AUDIO_PORT", 8081))
+    async def start(
+        self, host="0.0.0.0", port=None, ssl_context=None, reuse_port=False, sock=None
+    ):
+        """Serve on ``sock`` when one was handed over, else bind ``port``"""
+        if sock is None:
+            if port is None:
+                port = int(os.environ.get("AUDIO_PORT", 8081))
+            sock = bind_socket(host, port, reuse_port=reuse_port)
+        self.sock = sock
         self.runner = web.AppRunner(self.app)
         await self.runner.setup()
-        self.site = web.TCPSite(self.runner, host, port, ssl_context=ssl_context)
+        self.site = web.SockSite(self.runner, sock, ssl_context=ssl_context)
         await self.site.start()
-        logger.info(f"Audio Stream Server started on {host}:{port}")
+        logger.info(f"Audio Stream Server started on {self.site.name}")
+
+    async def stop_listening(self):
+        """Stop accepting connections; streams already running carry on"""
+        if self.site:
+            await self.site.stop()
+            self.site = None
+
+    def _http_listeners(self):
+        for encoder in self.encoders.values():
+            yield from encoder.clients
+        for tap in self.taps.values():
+            yield from tap.listeners
+
+    def active_listeners(self) -> int:
+        return sum(1 for _ in self._http_listeners())
+
+    def end_listeners(self):
+        """Finish every MP3/AAC and tap response as if its stream had ended"""
+        for listener in list(self._http_listeners()):
+            listener.push(None)
 
     async def stop(self):
         if self.site:
             await self.site.stop()
         if self.runner:
             await self.runner.cleanup()
+        for segmenter in list(self.segmenters.values()):
+            segmenter.stop()
+        for tap in list(self.taps.values()):
+            tap.stop()
+        for recorder in list(self.recorders.values()):
+            recorder.stop()
+        for replay in list(self.replays.values()):
+            replay.stop()
+        if self.record_writer.is_alive():
+            # Joining waits for the final flush; keep it off the loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.record_writer.shutdown
+            )
+        self.encoder_pool.shutdown()
 
     async def status_handler(self, request):
+        listeners = {}
+        for (stream_id, output_format), encoder in self.encoders.items():
+            listeners.setdefault(stream_id, []).extend(
+                dict(listener.stats(), format=output_format)
+                for listener in encoder.clients
+            )
         return web.json_response(
-            {"active_streams": list(self.relay_server.active_streams.keys())}
+            {
+                "active_streams": self.relay_server.available_stream_ids(),
+                "listeners": listeners,
+                "hls": list(self.segmenters),
+                "recordings": list(self.recorders),
+                "replay": {
+                    stream_id: replay.stats()
+                    for stream_id, replay in self.replays.items()
+                },
+                "taps": {
+                    f"{stream_id}@{rate}/{channels}": len(tap.listeners)
+                    for (stream_id, rate, channels), tap in self.taps.items()
+                },
+                "speaking": {
+                    record.stream_id: record.vad.active
+                    for record in self.relay_server.active_streams
+                    if record.vad is not None
+                },
+            }
+        )
+
+    def get_encoder(
+        self,
+        stream_id: str,
+        source_track,
+        output_format: str = "mp3",
+        keep_alive: bool = False,
+        codec: Mp3Codec = None,
+    ) -> SharedEncoder:
+        """Return the shared encoder for a stream and profile, creating it on
+        demand. Past ``max_profiles`` per stream, new profiles get the default."""
+        codec = codec or CODECS[output_format]()
+        key = (stream_id, codec.profile)
+        encoder = self.encoders.get(key)
+        if encoder is None and codec.profile != output_format:
+            profiles = sum(
+                1
+                for (encoder_stream, _), other in self.encoders.items()
+                if encoder_stream == stream_id and other.output_format == output_format
+            )
+            if profiles >= self.max_profiles:
+                logger.warning(
+                    f"{stream_id} already has {profiles} {output_format} profiles, "
+                    f"serving the default instead of {codec.profile}"
+                )
+                return self.get_encoder(stream_id, source_track, output_format)
+        if encoder is None or encoder.source_track is not source_track:
+            if encoder is not None:
+                # Sender reconnected with a new track under the same stream id
+                encoder.on_idle = None
+                encoder.stop()
+            # Frames are only gated for the sender track the gate measures
+            record = self.relay_server.active_streams.get(stream_id)
+            gate = record.vad if record and record.track is source_track else None
+            encoder = SharedEncoder(
+                stream_id,
+                self.relay_server.relay,
+                source_track,
+                self.encoder_pool,
+                output_format=output_format,
+                codec=codec,
+                on_idle=self._release_encoder,
+                prebuffer_seconds=self.prebuffer_ms / 1000,
+                prebuffer_bytes=self.prebuffer_max_bytes,
+                keep_alive=keep_alive,
+                gate=gate,
+            )
+            self.encoders[key] = encoder
+        return encoder
+
+    def prewarm(self, stream_id: str, source_track):
+        """Encode a new stream right away so its prebuffer is full on first play"""
+        if not self.prewarm_encoders or self.prebuffer_ms <= 0:
+            return
+        self.get_encoder(stream_id, source_track, keep_alive=True).start()
+
+    def _release_encoder(self, encoder: SharedEncoder):
+        if self.encoders.get(encoder.key) is encoder:
+            del self.encoders[encoder.key]
+
+    def get_segmenter(self, stream_id: str, source_track) -> HlsSegmenter:
+        """Return the HLS segmenter for a stream, starting it on demand"""
+        segmenter = self.segmenters.get(stream_id)
+        if segmenter is not None and (
+            segmenter.task.done() or segmenter.encoder.source_track is not source_track
+        ):
+            segmenter.on_idle = None
+            segmenter.stop()
+            segmenter = None
+        if segmenter is None:
+            encoder = self.get_encoder(stream_id, source_track, output_format="aac")
+            segmenter = HlsSegmenter(
+                stream_id,
+                encoder,
+                segment_duration=self.hls_segment_seconds,
+                segments=self.hls_segments,
+                on_idle=self._release_segmenter,
+            )
+            self.segmenters[stream_id] = segmenter
+        return segmenter
+
+    def _release_segmenter(self, segmenter: HlsSegmenter):
+        if self.segmenters.get(segmenter.stream_id) is segmenter:
+            del self.segmenters[segmenter.stream_id]
+
+    def start_recording(self, stream_id: str, source_track):
+        """Record a stream from its shared encoder, if recording is enabled"""
+        if not self.record:
+            return
+        if not self.record_writer.is_alive():
+            self.record_writer.start()
+        previous = self.recorders.pop(stream_id, None)
+        if previous is not None:
+            previous.stop()
+        encoder = self.get_encoder(
+            stream_id, source_track, output_format=self.record_format
+        )
+        self.recorders[stream_id] = StreamRecorder(
+            stream_id, encoder, self.record_writer, on_done=self._release_recorder
+        )
+
+    def _release_recorder(self, recorder: StreamRecorder):
+        if self.recorders.get(recorder.stream_id) is recorder:
+            del self.recorders[recorder.stream_id]
+
+    def start_replay(self, stream_id: str, source_track):
+        """Keep the last REPLAY_SECONDS of a stream from its shared MP3 encoder"""
+        if self.replay_seconds <= 0:
+            return
+        previous = self.replays.pop(stream_id, None)
+        if previous is not None:
+            previous.stop()
+        encoder = self.get_encoder(stream_id, source_track)
+        self.replays[stream_id] = ReplayBuffer(
+            stream_id,
+            encoder,
+            window_seconds=self.replay_seconds,
+            on_done=self._release_replay,
+        )
+
+    def _release_replay(self, replay: ReplayBuffer):
+        if self.replays.get(replay.stream_id) is replay:
+            del self.replays[replay.stream_id]
+
+    async def replay_handler(self, request):
+        """The recent past of a stream as one MP3 file, with byte ranges.
+
+        ``from`` and ``to`` are seconds relative to now (``-60s``) or Unix
+        times. Content-Location names the exact range served, so players
+        that come back with a Range header get the same bytes.
+        """
+        stream_id = request.match_info["stream_id"]
+        if stream_id == "latest":
+            stream_id = self.relay_server.latest_stream_id()
+        replay = self.replays.get(stream_id)
+        if replay is None:
+            return web.Response(status=404, text="No replay for this stream")
+
+        now = time.time()
+        try:
+            start = parse_replay_time(
+                request.query.get("from", f"-{replay.window_seconds}"), now
+            )
+            end = request.query.get("to")
+            end = parse_replay_time(end, now) if end is not None else None
+        except ValueError:
+            return web.Response(
+                status=400, text="from and to must be -<seconds>s or a Unix time"
+            )
+        chunks, start_ms, end_ms = replay.snapshot(start, end)
+        if not chunks:
+            return web.Response(status=404, text="Nothing buffered in that range")
+
+        total = sum(len(chunk.data) for chunk in chunks)
+        etag = f'"{stream_id}-{start_ms}-{end_ms}"'
+        headers = {
+            "Content-Type": "audio/mpeg",
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "no-cache",
+            "ETag": etag,
+            "Content-Location": (
+                f"replay.mp3?from={start_ms / 1000:.3f}&to={end_ms / 1000:.3f}"
+            ),
+        }
+        status, first, last = 200, 0, total
+        if "Range" in request.headers and request.headers.get("If-Range", etag) == etag:
+            try:
+                first, last, _ = request.http_range.indices(total)
+            except ValueError:
+                first = total
+            if first >= last:
+                return web.Response(
+                    status=416, headers={"Content-Range": f"bytes */{total}"}
+                )
+            status = 206
+            headers["Content-Range"] = f"bytes {first}-{last - 1}/{total}"
+
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = last - first
+        await response.prepare(request)
+        offset = 0
+        try:
+            for chunk in chunks:
+                size = len(chunk.data)
+                if offset + size > first and offset < last:
+                    view = memoryview(chunk.data)
+                    await response.write(
+                        view[max(first - offset, 0) : min(last - offset, size)]
+                    )
+                offset += size
+            await response.write_eof()
+        except (asyncio.CancelledError, ConnectionResetError):
+            logger.info("Replay client disconnected")
+        return response
+
+    def get_tap(
+        self, stream_id: str, source_track, sample_rate: int, channels: int
+    ) -> SharedTap:
+        """Return the shared PCM tap for a stream and format, creating it on demand"""
+        key = (stream_id, sample_rate, channels)
+        tap = self.taps.get(key)
+        if tap is None or tap.source_track is not source_track:
+            if tap is not None:
+                tap.on_idle = None
+                tap.stop()
+            tap = SharedTap(
+                stream_id,
+                self.relay_server.relay,
+                source_track,
+                sample_rate=sample_rate,
+                channels=channels,
+                on_idle=self._release_tap,
+            )
+            self.taps[key] = tap
+        return tap
+
+    def _release_tap(self, tap: SharedTap):
+        if self.taps.get(tap.key) is tap:
+            del self.taps[tap.key]
+
+    async def tap_handler(self, request):
+        """Raw s16le PCM over a binary WebSocket, for STT/wake-word pipelines.
+
+        The first message is a JSON text frame describing the format; every
+        following binary message is 20 ms of interleaved samples.
+        """
+        if self.relay_server.draining:
+            return self.draining_response()
+        stream_id = request.match_info["stream_id"]
+        if stream_id == "latest":
+            stream_id = self.relay_server.latest_stream_id()
+        try:
+            sample_rate = int(request.query.get("rate", 16000))
+            channels = int(request.query.get("channels", 1))
+        except ValueError:
+            return web.Response(status=400, text="rate and channels must be integers")
+        if sample_rate not in TAP_SAMPLE_RATES or channels not in (1, 2):
+            return web.Response(
+                status=400,
+                text=f"Supported rates: {TAP_SAMPLE_RATES}; channels: 1 or 2",
+            )
+        policy = request.query.get("backpressure", self.listener_backpressure)
+        if policy not in BACKPRESSURE_POLICIES:
+            return web.Response(
+                status=400, text=f"Unknown backpressure policy: {policy}"
+            )
+
+        record = await self.relay_server.ensure_stream(stream_id) if stream_id else None
+        if not record:
+            return web.Response(status=404, text="Stream not found")
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        tap = self.get_tap(stream_id, record.track, sample_rate, channels)
+        listener = tap.add_listener(
+            request.remote,
+            max_packets=self.listener_queue_packets,
+            policy=policy,
+            max_lag=self.listener_max_lag,
+        )
+        logger.info(f"PCM tap for {stream_id} ({sample_rate} Hz) to {request.remote}")
+
+        async def read_until_closed():
+            # Processes the client's close/ping frames; wakes the writer on close
+            async for _ in ws:
+                pass
+            listener.push(None)
+
+        reader = asyncio.create_task(read_until_closed())
+        try:
+            await ws.send_json(
+                {
+                    "type": "format",
+                    "stream_id": stream_id,
+                    "encoding": "s16le",
+                    "sample_rate": sample_rate,
+                    "channels": channels,
+                    "frame_samples": tap.frame_samples,
+                }
+            )
+            while True:
+                data = await listener.get()
+                if data is None:
+                    break
+                await ws.send_bytes(data)
+        except (asyncio.CancelledError, ConnectionResetError):
+            logger.info("Tap client disconnected")
+        except Exception as e:
+            logger.error(f"Tap error: {e}")
+        finally:
+            reader.cancel()
+            tap.remove_listener(listener)
+            if not ws.closed:
+                await ws.close(code=WSCloseCode.OK, message=b"stream ended")
+        return ws
+
+    async def hls_playlist_handler(self, request):
+        """Live HLS playlist of short AAC segments, cut once per stream"""
+        stream_id = request.match_info["stream_id"]
+        record = await self.relay_server.ensure_stream(stream_id)
+        if not record:
+            return web.Response(status=404, text="Stream not found")
+
+        segmenter = self.get_segmenter(stream_id, record.track)
+        segmenter.touch()
+
+        # Blocking reload (_HLS_msn), or wait for the first segment of a new stream
+        wanted = request.query.get("_HLS_msn")
+        sequence = int(wanted) if wanted and wanted.isdigit() else 0
+        if segmenter.next_sequence <= sequence:
+            try:
+                await segmenter.wait_for_sequence(
+                    sequence, timeout=segmenter.segment_duration * 3
+                )
+            except asyncio.TimeoutError:
+                pass
+
+        return web.Response(
+            text=segmenter.playlist(),
+            content_type="application/vnd.apple.mpegurl",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    async def hls_segment_handler(self, request):
+        segmenter = self.segmenters.get(request.match_info["stream_id"])
+        data = None
+        if segmenter is not None:
+            segmenter.touch()
+            data = segmenter.segment(int(request.match_info["sequence"]))
+        if data is None:
+            return web.Response(status=404, text="Segment not found")
+        return web.Response(
+            body=data,
+            content_type="audio/aac",
+            headers={"Cache-Control": "max-age=60"},
+        )
+
+    def draining_response(self):
+        return web.Response(
+            status=503,
+            text="Server is restarting",
+            headers={"Retry-After": str(int(self.relay_server.drain_spread) + 1)},
         )
 
     async def stream_handler(self, request):
+        if self.relay_server.draining:
+            return self.draining_response()
         stream_id = request.match_info["stream_id"]
-        stream_info = self.relay_server.active_streams.get(stream_id)
+        record = await self.relay_server.ensure_stream(stream_id)
 
-        if not stream_info:
+        if not record:
             return web.Response(status=404, text="Stream not found")
 
-        logger.info(f"Starting audio stream for {stream_id} to {request.remote}")
+        policy = request.query.get("backpressure", self.listener_backpressure)
+        if policy not in BACKPRESSURE_POLICIES:
+            return web.Response(
+                status=400, text=f"Unknown backpressure policy: {policy}"
+            )
+
+        try:
+            codec = Mp3Codec.from_query(request.query)
+        except ValueError as e:
+            return web.Response(status=400, text=str(e))
 
-        # Subscribe to the track via MediaRelay to get a fresh consumer
-        source_track = stream_info["track"]
+        # Attach to the shared encoder; it subscribes to the relay only once
         try:
-            track = self.relay_server.relay.subscribe(source_track)
+            encoder = self.get_encoder(stream_id, record.track, codec=codec)
+            listener = encoder.add_listener(
+                request.remote,
+                max_packets=self.listener_queue_packets,
+                policy=policy,
+                max_lag=self.listener_max_lag,
+            )
         except Exception as e:
             logger.error(f"Failed to subscribe to track: {e}")
             return web.Response(status=500, text="Failed to subscribe to media track")
 
+        logger.info(f"Starting audio stream for {stream_id} to {request.remote}")
+
         response = web.StreamResponse(
             status=200,
             reason="OK",
@@ -166,57 +649,30 @@ class AudioStreamServer:
                 "Content-Type": "audio/mpeg",
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
+                "X-Audio-Profile": encoder.codec.profile,
             },
         )
-        await response.prepare(request)
 
-        # Setup MP3 encoding
         try:
-            # Create MP3 encoder
-            codec = av.codec.Codec("mp3", "w")
-            codec_context = av.CodecContext.create(codec)
-            codec_context.bit_rate = 128000
-            codec_context.sample_rate = 44100
-            codec_context.format = av.AudioFormat("s16p")
-            codec_context.layout = "stereo"
-            codec_context.time_base = fractions.Fraction(1, 44100)
-
-            # Open the codec
-            codec_context.open()
-
-            # Resampler to ensure compatible format for MP3 encoder
-            resampler = av.AudioResampler(
-                format="s16p",
-                layout="stereo",
-                rate=44100,
-            )
+            await response.prepare(request)
 
-            # Start streaming
             while True:
-                try:
-                    frame = await track.recv()
-
-                    # Resample
-                    resampled_frames = resampler.resample(frame)
-
-                    for r_frame in resampled_frames:
-                        packets = codec_context.encode(r_frame)
-                        for packet in packets:
-                            await response.write(bytes(packet))
-
-                except Exception as e:
-                    # End of stream or error
-                    logger.info(f"Stream ended or error: {e}")
+                packet = await listener.get()
+                if packet is None:
+                    logger.info(f"Stream {stream_id} ended for {request.remote}")
                     break
+                await response.write(packet)
 
-        except asyncio.CancelledError:
+        except (asyncio.CancelledError, ConnectionResetError):
             logger.info("Client disconnected")
         except Exception as e:
             logger.error(f"Streaming error: {e}")
         finally:
-            # Clean up track subscription
-            # track.stop() # aiortc tracks don't have stop(), they stop when upstream stops or GC?
-            # MediaRelay tracks handle cleanup when they are no longer iterated?
-            pass
+            encoder.remove_listener(listener)
+            if listener.bytes_dropped:
+                logger.info(
+                    f"Listener {request.remote} on {stream_id} dropped "
+                    f"{listener.bytes_dropped} bytes ({listener.packets_dropped} packets)"
+                )
 
         return response
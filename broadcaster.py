@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from aiohttp import WSCloseCode
+
+from metrics import WS_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    """Fan messages out to /ws clients without letting one client stall the rest.
+
+    Each message is serialized once and sent to all targets concurrently, each
+    send bounded by ``send_timeout``. A client that times out is closed; its
+    handler then runs the normal connection cleanup. Stream announcements are
+    coalesced for ``coalesce_delay`` seconds so a burst of reconnecting senders
+    produces one ``stream_events`` message instead of one message per stream.
+
+    ``post()`` is for periodic state such as levels: it never waits, and while
+    a message with the same key is still going out only the newest one is
+    kept to follow it.
+    """
+
+    def __init__(
+        self,
+        connections: Dict[str, dict],
+        send_timeout: float = 2.0,
+        coalesce_delay: float = 0.05,
+    ):
+        self.connections = connections
+        self.send_timeout = send_timeout
+        self.coalesce_delay = coalesce_delay
+        self.pending: Dict[str, str] = {}  # stream_id -> latest event type
+        self.evicting = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.posting = set()
+        self.queued: Dict[str, Tuple[str, Optional[list]]] = {}
+
+    def announce(self, event_type: str, stream_id: str):
+        """Queue a stream_available/stream_ended event for the next flush"""
+        # A later event for the same stream supersedes the earlier one
+        self.pending.pop(stream_id, None)
+        self.pending[stream_id] = event_type
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_later(
+                self.coalesce_delay, self._flush
+            )
+
+    def _flush(self):
+        self._flush_handle = None
+        events = [
+            {"type": event_type, "stream_id": stream_id}
+            for stream_id, event_type in self.pending.items()
+        ]
+        self.pending.clear()
+        if not events:
+            return
+        if len(events) == 1:
+            message = events[0]
+        else:
+            message = {"type": "stream_events", "events": events}
+        self._spawn(self.send(json.dumps(message)))
+
+    def post(self, key: str, message: str, connection_ids: Iterable[str] = None):
+        """Send in the background, superseding a queued message with the same key"""
+        if connection_ids is not None:
+            connection_ids = list(connection_ids)
+        if key in self.posting:
+            self.queued[key] = (message, connection_ids)
+            return
+        self.posting.add(key)
+        self._spawn(self._post(key, message, connection_ids))
+
+    async def _post(self, key: str, message: str, connection_ids: Optional[list]):
+        try:
+            while True:
+                await self.send(message, connection_ids)
+                queued = self.queued.pop(key, None)
+                if queued is None:
+                    break
+                message, connection_ids = queued
+        finally:
+            self.posting.discard(key)
+            self.queued.pop(key, None)
+
+    async def send(self, message: str, connection_ids: Iterable[str] = None) -> int:
+        """Send a serialized message; returns how many clients received it"""
+        if connection_ids is None:
+            connection_ids = list(self.connections)
+        targets = []
+        for connection_id in connection_ids:
+            conn = self.connections.get(connection_id)
+            if conn is not None and connection_id not in self.evicting:
+                targets.append((connection_id, conn["ws"]))
+        if not targets:
+            return 0
+
+        results = await asyncio.gather(
+            *(self._send_one(cid, ws, message) for cid, ws in targets)
+        )
+        return sum(results)
+
+    async def _send_one(self, connection_id: str, ws, message: str) -> bool:
+        try:
+            await asyncio.wait_for(ws.send_str(message), timeout=self.send_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.evict(connection_id, ws)
+        except Exception as e:
+            # Closing or closed: the connection's own handler cleans it up
+            logger.debug(f"Send to {connection_id} failed: {e}")
+        return False
+
+    def evict(self, connection_id: str, ws):
+        if connection_id in self.evicting:
+            return
+        logger.warning(
+            f"Evicting {connection_id}: send blocked for over {self.send_timeout}s"
+        )
+        WS_EVICTIONS.inc()
+        self.evicting.add(connection_id)
+
+        async def close():
+            try:
+                await asyncio.wait_for(
+                    ws.close(code=WSCloseCode.TRY_AGAIN_LATER, message=b"too slow"),
+                    timeout=self.send_timeout,
+                )
+            except Exception:
+                pass
+            finally:
+                self.evicting.discard(connection_id)
+
+        self._spawn(close())
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
@@ -0,0 +1,317 @@
+"""Multi-process mode: N workers share the listening ports via SO_REUSEPORT.
+
+The supervisor process runs a small stream registry on a Unix socket. Every
+worker registers the sender streams it owns there and mirrors everybody
+else's. When a receiver or MP3 listener on worker B asks for a stream owned
+by worker A, B opens A's feed socket and receives the decoded audio as raw
+s16 PCM, which it then relays locally like any other track.
+
+The supervisor only runs the registry, so this module does not import
+aiortc, PyAV or NumPy; the feed code imports them where it runs.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import struct
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# payload length, pts, sample rate, samples per channel, channels
+FRAME_HEADER = struct.Struct("!IqIHB")
+
+
+def runtime_dir() -> str:
+    path = os.environ.get(
+        "CLUSTER_RUNTIME_DIR", os.path.join(tempfile.gettempdir(), "voice_streaming")
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _send_json(writer: asyncio.StreamWriter, message: dict):
+    writer.write(json.dumps(message).encode() + b"\n")
+
+
+class StreamRegistryServer:
+    """Supervisor-side registry of which worker owns which stream"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.streams: "OrderedDict[str, dict]" = OrderedDict()
+        self.clients: Set[asyncio.StreamWriter] = set()
+        self.server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info(f"Stream registry listening on {self.path}")
+
+    def _publish(self, message: dict, exclude=None):
+        for writer in list(self.clients):
+            if writer is not exclude:
+                _send_json(writer, message)
+
+    async def _handle(self, reader, writer):
+        self.clients.add(writer)
+        owned = set()
+        _send_json(
+            writer,
+            {
+                "event": "snapshot",
+                "streams": [
+                    {"stream_id": stream_id, **info}
+                    for stream_id, info in self.streams.items()
+                ],
+            },
+        )
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                stream_id = message.get("stream_id")
+                if message.get("op") == "register":
+                    info = {"worker": message["worker"], "feed": message["feed"]}
+                    self.streams.pop(stream_id, None)
+                    self.streams[stream_id] = info
+                    owned.add(stream_id)
+                    self._publish(
+                        {"event": "stream_available", "stream_id": stream_id, **info},
+                        exclude=writer,
+                    )
+                elif message.get("op") == "unregister":
+                    owned.discard(stream_id)
+                    if self.streams.pop(stream_id, None) is not None:
+                        self._publish(
+                            {"event": "stream_ended", "stream_id": stream_id},
+                            exclude=writer,
+                        )
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logger.warning(f"Registry client error: {e}")
+        finally:
+            self.clients.discard(writer)
+            # A worker went away: its streams went with it
+            for stream_id in owned:
+                if self.streams.pop(stream_id, None) is not None:
+                    self._publish({"event": "stream_ended", "stream_id": stream_id})
+            writer.close()
+
+
+class ClusterWorker:
+    """Worker-side registry mirror, feed server and remote stream attachment"""
+
+    def __init__(self, server, index: int, directory: str):
+        self.server = server
+        self.index = index
+        self.registry_path = os.path.join(directory, "registry.sock")
+        self.feed_path = os.path.join(directory, f"worker-{index}.sock")
+        self.streams: "OrderedDict[str, dict]" = OrderedDict()
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.feed_server = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if os.path.exists(self.feed_path):
+            os.unlink(self.feed_path)
+        self.feed_server = await asyncio.start_unix_server(
+            self._serve_feed, path=self.feed_path
+        )
+        reader, self.writer = await asyncio.open_unix_connection(self.registry_path)
+        self.task = asyncio.create_task(self._read_events(reader))
+        logger.info(f"Cluster worker {self.index} joined registry")
+
+    def is_local(self, stream_id: str) -> bool:
+        info = self.streams.get(stream_id)
+        return info is None or info["worker"] == self.index
+
+    def stream_ids(self):
+        return list(self.streams.keys())
+
+    def latest_stream_id(self) -> Optional[str]:
+        return next(reversed(self.streams), None)
+
+    def register(self, stream_id: str):
+        self.streams.pop(stream_id, None)
+        self.streams[stream_id] = {"worker": self.index, "feed": self.feed_path}
+        if self.writer is not None:
+            _send_json(
+                self.writer,
+                {
+                    "op": "register",
+                    "stream_id": stream_id,
+                    "worker": self.index,
+                    "feed": self.feed_path,
+                },
+            )
+
+    def unregister(self, stream_id: str):
+        info = self.streams.get(stream_id)
+        if info is None or info["worker"] != self.index:
+            return
+        del self.streams[stream_id]
+        if self.writer is not None:
+            _send_json(self.writer, {"op": "unregister", "stream_id": stream_id})
+
+    async def _read_events(self, reader: asyncio.StreamReader):
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                event = message.get("event")
+                if event == "snapshot":
+                    for info in message["streams"]:
+                        stream_id = info.pop("stream_id")
+                        self.streams[stream_id] = info
+                elif event == "stream_available":
+                    stream_id = message["stream_id"]
+                    self.streams.pop(stream_id, None)
+                    self.streams[stream_id] = {
+                        "worker": message["worker"],
+                        "feed": message["feed"],
+                    }
+                    await self.server.broadcast_stream_available(stream_id)
+                elif event == "stream_ended":
+                    stream_id = message["stream_id"]
+                    self.streams.pop(stream_id, None)
+                    await self.server.broadcast_stream_ended(stream_id)
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logger.error(f"Lost connection to stream registry: {e}")
+
+    async def attach(self, stream_id: str):
+        """Open a PCM feed for a stream owned by another worker"""
+        from cluster_feed import RemoteFeedTrack
+
+        info = self.streams.get(stream_id)
+        if info is None or info["worker"] == self.index:
+            return None
+        try:
+            reader, writer = await asyncio.open_unix_connection(info["feed"])
+        except OSError as e:
+            logger.error(
+                f"Could not reach worker {info['worker']} for {stream_id}: {e}"
+            )
+            return None
+        _send_json(writer, {"stream_id": stream_id})
+        logger.info(f"Attached to {stream_id} on worker {info['worker']}")
+        return RemoteFeedTrack(reader, writer)
+
+    async def _serve_feed(self, reader, writer):
+        import av
+        from aiortc.mediastreams import MediaStreamError
+
+        track = None
+        try:
+            request = json.loads(await reader.readline())
+            record = self.server.active_streams.get(request.get("stream_id"))
+            if not record or record.remote:
+                return
+
+            track = self.server.relay.subscribe(record.track)
+            resampler = None
+            while True:
+                frame = await track.recv()
+                if frame.format.name != "s16" or frame.layout.name not in (
+                    "mono",
+                    "stereo",
+                ):
+                    if resampler is None:
+                        resampler = av.AudioResampler(format="s16", layout="stereo")
+                    frames = resampler.resample(frame)
+                else:
+                    frames = [frame]
+
+                for out in frames:
+                    payload = out.to_ndarray().tobytes()
+                    channels = len(out.layout.channels)
+                    writer.write(
+                        FRAME_HEADER.pack(
+                            len(payload),
+                            out.pts or 0,
+                            out.sample_rate,
+                            out.samples,
+                            channels,
+                        )
+                    )
+                    writer.write(payload)
+                await writer.drain()
+        except (MediaStreamError, ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            if track is not None:
+                track.stop()
+            writer.close()
+
+
+def find_available_port(host: str, base_port: int, attempts: int = 10) -> int:
+    for port in range(base_port, base_port + attempts):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind((host, port))
+                return port
+            except OSError:
+                logger.warning(f"Port {port} is busy, trying {port + 1}...")
+    raise OSError(
+        f"Could not bind to any port in range {base_port}-{base_port + attempts}"
+    )
+
+
+def worker_main(index: int, port: int, directory: str, log_level: str):
+    logging.basicConfig(
+        level=getattr(logging, log_level, logging.INFO),
+        format=f"%(asctime)s - worker{index} - %(name)s - %(levelname)s - %(message)s",
+    )
+    from webrtc_server_relay import VoiceStreamingServer
+
+    server = VoiceStreamingServer()
+    server.cluster = ClusterWorker(server, index, directory)
+    try:
+        asyncio.run(server.run_server(port=port, reuse_port=True))
+    except KeyboardInterrupt:
+        pass
+
+
+async def supervise(workers: int, host: str, base_port: int, on_port_selected=None):
+    """Run the registry and keep ``workers`` worker processes alive"""
+    directory = runtime_dir()
+    registry = StreamRegistryServer(os.path.join(directory, "registry.sock"))
+    await registry.start()
+
+    port = find_available_port(host, base_port)
+    if on_port_selected:
+        on_port_selected(port)
+
+    log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    context = multiprocessing.get_context("spawn")
+    processes: Dict[int, multiprocessing.Process] = {}
+
+    def spawn(index: int):
+        process = context.Process(
+            target=worker_main,
+            args=(index, port, directory, log_level),
+            name=f"voice-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        processes[index] = process
+
+    for index in range(workers):
+        spawn(index)
+    logger.info(f"Started {workers} workers sharing port {port}")
+
+    try:
+        while True:
+            await asyncio.sleep(1.0)
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    logger.warning(
+                        f"Worker {index} exited with {process.exitcode}, restarting"
+                    )
+                    spawn(index)
+    finally:
+        for process in processes.values():
+            process.terminate()
@@ -0,0 +1,45 @@
+import asyncio
+import fractions
+
+import av
+import numpy as np
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+from cluster import FRAME_HEADER
+
+
+class RemoteFeedTrack(MediaStreamTrack):
+    """Audio track fed with PCM frames from another worker's feed socket"""
+
+    kind = "audio"
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+        try:
+            header = await self.reader.readexactly(FRAME_HEADER.size)
+            length, pts, sample_rate, samples, channels = FRAME_HEADER.unpack(header)
+            payload = await self.reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.stop()
+            raise MediaStreamError
+
+        frame = av.AudioFrame.from_ndarray(
+            np.frombuffer(payload, dtype=np.int16).reshape(1, -1),
+            format="s16",
+            layout="stereo" if channels == 2 else "mono",
+        )
+        frame.sample_rate = sample_rate
+        frame.pts = pts
+        frame.time_base = fractions.Fraction(1, sample_rate)
+        return frame
+
+    def stop(self):
+        super().stop()
+        self.writer.close()
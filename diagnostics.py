@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from metrics import LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop runs a timer scheduled every interval.
+
+    Anything that blocks the loop (encoding, JSON, slow callbacks) shows up
+    as lag, which delays RTP, signaling and HTTP writes alike.
+    """
+
+    def __init__(self, interval: float = 0.1, warn_threshold: float = 0.1):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag > self.warn_threshold:
+                logger.warning(f"Event loop lag {lag * 1000:.0f} ms")
+
+    def stats(self) -> dict:
+        return {
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+        }
+
+
+class SamplingProfiler:
+    """Sample a thread's Python stack and return collapsed stacks.
+
+    The output is the "folded" format understood by flamegraph.pl and
+    speedscope: one ``frame;frame;frame count`` line per unique stack.
+    """
+
+    def __init__(self, thread_id: int, hz: int = 200):
+        self.thread_id = thread_id
+        self.hz = hz
+        self.lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    def run(self, seconds: float) -> str:
+        """Blocking: call from a worker thread, never from the profiled thread"""
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            stacks = Counter()
+            interval = 1.0 / self.hz
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    stacks[self._fold(frame)] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            module = code.co_filename.rsplit("/", 1)[-1]
+            names.append(f"{code.co_name} ({module}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
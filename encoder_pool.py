@@ -0,0 +1,125 @@
+import asyncio
+import fractions
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List
+
+from stream_encoder import Mp3Codec
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+# Codec state held inside each worker process, keyed by SharedEncoder.codec_key
+_WORKER_CODECS: Dict[str, Mp3Codec] = {}
+
+
+def _serialize_frame(frame) -> tuple:
+    return (
+        frame.to_ndarray(),
+        frame.format.name,
+        frame.layout.name,
+        frame.sample_rate,
+        frame.pts,
+        frame.time_base,
+    )
+
+
+def _deserialize_frame(payload: tuple):
+    import av
+
+    samples, format_name, layout, sample_rate, pts, time_base = payload
+    frame = av.AudioFrame.from_ndarray(samples, format=format_name, layout=layout)
+    frame.sample_rate = sample_rate
+    frame.pts = pts
+    frame.time_base = time_base or fractions.Fraction(1, sample_rate)
+    return frame
+
+
+def _process_encode(codec_key: str, codec_type, config: dict, payloads: List[tuple]):
+    codec = _WORKER_CODECS.get(codec_key)
+    if codec is None:
+        codec = _WORKER_CODECS[codec_key] = codec_type(**config)
+    return codec.encode([_deserialize_frame(p) for p in payloads])
+
+
+def _process_release(codec_key: str):
+    _WORKER_CODECS.pop(codec_key, None)
+
+
+class EncoderPool:
+    """Run MP3 resample/encode work off the event loop.
+
+    - ``inline``: encode on the loop (previous behaviour)
+    - ``thread``: a shared thread pool; PyAV releases the GIL in codec work
+    - ``process``: single-worker process pools; each encoder is pinned to one
+      worker so its codec state stays in that process
+    """
+
+    def __init__(self, mode: str = "thread", workers: int = 2):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown encoder executor: {mode}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.thread_pool = None
+        self.process_pools: List[ProcessPoolExecutor] = []
+        self.assignments: Dict[str, ProcessPoolExecutor] = {}
+        self._next_process = 0
+        self.closed = False
+
+        if mode == "thread":
+            self.thread_pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="encoder"
+            )
+        elif mode == "process":
+            context = multiprocessing.get_context("spawn")
+            self.process_pools = [
+                ProcessPoolExecutor(max_workers=1, mp_context=context)
+                for _ in range(self.workers)
+            ]
+        logger.info(f"Encoder pool: {mode} ({self.workers} workers)")
+
+    def encode(self, codec_key: str, codec: Mp3Codec, frames: List) -> asyncio.Future:
+        loop = asyncio.get_event_loop()
+        if self.mode == "thread":
+            return loop.run_in_executor(self.thread_pool, codec.encode, frames)
+        if self.mode == "process":
+            payloads = [_serialize_frame(frame) for frame in frames]
+            return loop.run_in_executor(
+                self._pool_for(codec_key),
+                _process_encode,
+                codec_key,
+                type(codec),
+                codec.config,
+                payloads,
+            )
+
+        future = loop.create_future()
+        try:
+            future.set_result(codec.encode(frames))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _pool_for(self, codec_key: str) -> ProcessPoolExecutor:
+        pool = self.assignments.get(codec_key)
+        if pool is None:
+            pool = self.process_pools[self._next_process % len(self.process_pools)]
+            self._next_process += 1
+            self.assignments[codec_key] = pool
+        return pool
+
+    def release(self, codec_key: str):
+        """Forget an encoder's codec state once it has stopped"""
+        pool = self.assignments.pop(codec_key, None)
+        if pool is not None and not self.closed:
+            # Encoders stopping during shutdown would otherwise hit a closed pool
+            pool.submit(_process_release, codec_key)
+
+    def shutdown(self):
+        self.closed = True
+        if self.thread_pool is not None:
+            self.thread_pool.shutdown(wait=False)
+        for pool in self.process_pools:
+            pool.shutdown(wait=False)
@@ -26,6 +26,7 @@ export interface VoiceReceivingCardConfig extends LovelaceCardConfig {
   server_url?: string;
   auto_play?: boolean;
   volume_boost?: number;
+  latency?: "live" | "reliable";
 }
 
 export interface HomeAssistant {
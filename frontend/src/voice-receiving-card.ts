@@ -26,6 +26,9 @@ const CONSTANTS = {
   },
 };
 
+// 0-255 band levels from the server's audio_levels reports
+type BandLevels = number[];
+
 @customElement("voice-receiving-card")
 export class VoiceReceivingCard extends LitElement {
   @property({ attribute: false }) public hass!: HomeAssistant;
@@ -44,6 +47,7 @@ export class VoiceReceivingCard extends LitElement {
   private webrtc: WebRTCManager | null = null;
   private animationFrame: number | null = null;
   private watchInterval: any = null;
+  private serverLevels: BandLevels | null = null;
 
   static get styles() {
     return [
@@ -303,6 +307,10 @@ export class VoiceReceivingCard extends LitElement {
         // Set the stream directly - it's already a MediaStream
         this.audioElement.srcObject = stream;
 
+        // Meters come from the server; the local analyser only covers the gap
+        // until the first report, or streams without server levels
+        if (this.selectedStream) this.webrtc?.subscribeLevels(this.selectedStream);
+
         // Attempt to play
         this.audioElement
           .play()
@@ -323,6 +331,12 @@ export class VoiceReceivingCard extends LitElement {
       }
     });
 
+    this.webrtc.addEventListener("audio-levels", (e: any) => {
+      if (e.detail.stream_id !== this.selectedStream) return;
+      if (!this.serverLevels) this.webrtc?.releaseAnalyser();
+      this.serverLevels = e.detail.bands;
+    });
+
     this.webrtc.addEventListener("audio-data", (e: any) => {
       if (this.status !== "connected") {
         this.status = "connected";
@@ -346,10 +360,12 @@ export class VoiceReceivingCard extends LitElement {
     if (this.selectedStream === streamId && (this.isActive || this.status === 'connecting')) return;
 
     this.selectedStream = streamId;
-    this.webrtc?.startReceiving(streamId);
+    this.webrtc?.startReceiving(streamId, this.config.latency);
   }
 
     private stopReceiving() {
+      if (this.selectedStream) this.webrtc?.unsubscribeLevels(this.selectedStream);
+      this.serverLevels = null;
       if (this.isWatching) {
           // If watching, stop stream but keep connection open for updates
           this.webrtc?.stopStream();
@@ -378,20 +394,28 @@ export class VoiceReceivingCard extends LitElement {
     if (!ctx) return;
 
     const draw = () => {
-      const analyser = this.webrtc?.getAnalyser();
-      if (!analyser) {
-        this.animationFrame = requestAnimationFrame(draw);
-        return;
+      let dataArray: ArrayLike<number>;
+      if (this.serverLevels) {
+        dataArray = this.serverLevels;
+      } else {
+        const analyser = this.webrtc?.getAnalyser();
+        if (!analyser) {
+          this.animationFrame = requestAnimationFrame(draw);
+          return;
+        }
+        const bytes = new Uint8Array(analyser.frequencyBinCount);
+        analyser.getByteFrequencyData(bytes);
+        dataArray = bytes;
       }
-
-      const bufferLength = analyser.frequencyBinCount;
-      const dataArray = new Uint8Array(bufferLength);
-      analyser.getByteFrequencyData(dataArray);
+      const bufferLength = dataArray.length;
 
       ctx.fillStyle = "rgba(240, 240, 240, 0.3)"; // Slight transparency for trail effect? No, opaque.
       ctx.fillRect(0, 0, this.canvas.width, this.canvas.height);
 
-      const barWidth = (this.canvas.width / bufferLength) * 2.5;
+      // Server bands are log-spaced; the FFT's upper bins are mostly empty
+      const barWidth = this.serverLevels
+        ? this.canvas.width / bufferLength - 1
+        : (this.canvas.width / bufferLength) * 2.5;
       let barHeight;
       let x = 0;
 
@@ -424,7 +448,7 @@ export class VoiceReceivingCard extends LitElement {
     try {
       // If not connected, start receiving (which connects WebSocket)
       if (this.status !== "connected") {
-        await this.webrtc?.startReceiving();
+        await this.webrtc?.startReceiving(undefined, this.config.latency);
       } else {
       }
     } catch (e: any) {
@@ -1,5 +1,8 @@
 export type WebRTCState = "disconnected" | "connecting" | "connected" | "error";
 
+// "live" lets the server skip audio to stay near real time; "reliable" plays everything
+export type LatencyPolicy = "live" | "reliable";
+
 export interface WebRTCOptions {
   serverUrl?: string;
   noiseSuppression?: boolean;
@@ -19,6 +22,7 @@ export class WebRTCManager extends EventTarget {
   private reconnectTimer: number | null = null;
   private retryCount = 0;
   private readonly maxRetries = 5;
+  private drainDelay: number | null = null; // server-chosen delay for the next reconnect
 
   constructor(config: WebRTCOptions = {}) {
     super();
@@ -48,6 +52,15 @@ export class WebRTCManager extends EventTarget {
     return this.analyser;
   }
 
+  /** Stop the local FFT for this track; the caller draws server-side levels instead */
+  public releaseAnalyser(): void {
+    if (this.audioContext) {
+      this.audioContext.close();
+      this.audioContext = null;
+      this.analyser = null;
+    }
+  }
+
   private setState(newState: WebRTCState, error?: string) {
     this.state = newState;
     this.dispatchEvent(
@@ -90,7 +103,7 @@ export class WebRTCManager extends EventTarget {
     }
   }
 
-  public async startReceiving(streamId?: string): Promise<void> {
+  public async startReceiving(streamId?: string, latency?: LatencyPolicy): Promise<void> {
     try {
       this.setState("connecting");
       await this.connectWebSocket();
@@ -106,6 +119,7 @@ export class WebRTCManager extends EventTarget {
       this.sendWebSocketMessage({
         type: "start_receiving",
         stream_id: streamId,
+        latency,
       });
 
       // Don't set connected yet - wait for WebRTC negotiation
@@ -122,6 +136,29 @@ export class WebRTCManager extends EventTarget {
     }
   }
 
+  /** Ask the server for RMS/peak/band levels instead of running a local FFT */
+  public subscribeLevels(streamId?: string): void {
+    this.sendWebSocketMessage({ type: "subscribe_levels", stream_id: streamId });
+  }
+
+  public unsubscribeLevels(streamId?: string): void {
+    this.sendWebSocketMessage({ type: "unsubscribe_levels", stream_id: streamId });
+  }
+
+  /** Receive periodic packet loss / jitter / RTT summaries for a stream (or all) */
+  public subscribeQuality(streamId?: string): void {
+    this.sendWebSocketMessage({ type: "subscribe_quality", stream_id: streamId });
+  }
+
+  public unsubscribeQuality(streamId?: string): void {
+    this.sendWebSocketMessage({ type: "unsubscribe_quality", stream_id: streamId });
+  }
+
+  /** Set a sender's gain (0-4) in the server-side room mix */
+  public setRoomGain(streamId: string, gain: number): void {
+    this.sendWebSocketMessage({ type: "set_room_gain", stream_id: streamId, gain });
+  }
+
   public stopStream() {
     if (this.websocket && this.websocket.readyState === WebSocket.OPEN) {
       this.sendWebSocketMessage({ type: "stop_stream" });
@@ -323,9 +360,37 @@ export class WebRTCManager extends EventTarget {
         this.dispatchEvent(new CustomEvent("stream-removed", { detail: { streamId: data.stream_id } }));
         break;
 
+      case "stream_events": // Coalesced stream_available / stream_ended burst
+        for (const event of data.events) {
+          await this.handleMessage(event);
+        }
+        break;
+
       case "audio_data":
         this.dispatchEvent(new CustomEvent("audio-data", { detail: data }));
         break;
+
+      case "audio_levels":
+        this.dispatchEvent(new CustomEvent("audio-levels", { detail: data }));
+        break;
+
+      case "reconnect": // Server is draining for a restart
+        this.drainDelay = data.delay_ms;
+        if (!this.peerConnection && this.websocket) {
+          // Nothing to lose: move to the new server now (after our delay)
+          this.websocket.close();
+        }
+        break;
+
+      case "quality":
+        this.dispatchEvent(new CustomEvent("stream-quality", { detail: data }));
+        break;
+
+      case "vad": // Sender started or stopped talking
+        this.dispatchEvent(
+          new CustomEvent("voice-activity", { detail: { streamId: data.stream_id, active: data.active } })
+        );
+        break;
     }
   }
 
@@ -352,7 +417,8 @@ export class WebRTCManager extends EventTarget {
   private handleReconnect() {
     if (this.retryCount < this.maxRetries) {
       this.retryCount++;
-      const delay = Math.min(1000 * Math.pow(1.5, this.retryCount), 30000);
+      const delay = this.drainDelay ?? Math.min(1000 * Math.pow(1.5, this.retryCount), 30000);
+      this.drainDelay = null;
 
       this.setState("connecting", `Reconnecting in ${Math.round(delay / 1000)}s...`);
 
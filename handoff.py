@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_HANDOFF_SOCKETS = 8
+
+
+def handoff_path() -> str:
+    return os.environ.get(
+        "HANDOFF_SOCKET",
+        os.path.join(tempfile.gettempdir(), "voice_streaming", "handoff.sock"),
+    )
+
+
+def bind_socket(host: str, port: int, reuse_port: bool = False) -> socket.socket:
+    """Bind and listen right away, so connections queue until we accept them"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        sock.listen(128)
+    except OSError:
+        sock.close()
+        raise
+    sock.setblocking(False)
+    return sock
+
+
+def take_over(path: str, timeout: float = 5.0) -> Optional[Dict[str, socket.socket]]:
+    """Ask a running server for its listening sockets.
+
+    Returns ``None`` when no server answers on ``path``. The old server stops
+    accepting as soon as it has sent the sockets; connections that arrive in
+    between wait in the shared listen queue.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout)
+            conn.connect(path)
+            data, fds, _, _ = socket.recv_fds(conn, 4096, MAX_HANDOFF_SOCKETS)
+    except OSError as e:
+        logger.debug(f"No server to take over from at {path}: {e}")
+        return None
+
+    names = json.loads(data)["sockets"]
+    sockets = {}
+    for name, fd in zip(names, fds):
+        sock = socket.socket(fileno=fd)
+        sock.setblocking(False)
+        sockets[name] = sock
+    logger.info(f"Took over listening sockets {names} from the previous server")
+    return sockets
+
+
+class HandoffServer:
+    """Unix socket on which a starting successor collects our listening sockets.
+
+    The descriptors are passed with SCM_RIGHTS, so the successor accepts on
+    the very same listen queues and no connection is refused during the
+    switch. ``on_handoff`` runs after each successful transfer.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sockets: Callable[[], Dict[str, socket.socket]],
+        on_handoff: Callable[[], None],
+    ):
+        self.path = path
+        self.sockets = sockets
+        self.on_handoff = on_handoff
+        self.sock: Optional[socket.socket] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(1)
+        self.sock.setblocking(False)
+        self.task = asyncio.create_task(self._serve())
+
+    def stop(self):
+        # The path is left alone: a successor may already have bound it again
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            conn, _ = await loop.sock_accept(self.sock)
+            with conn:
+                sockets = self.sockets()
+                header = json.dumps({"sockets": list(sockets)}).encode()
+                try:
+                    conn.setblocking(True)
+                    socket.send_fds(
+                        conn, [header], [sock.fileno() for sock in sockets.values()]
+                    )
+                except OSError as e:
+                    logger.warning(f"Socket handoff failed: {e}")
+                    continue
+            logger.info(f"Handed listening sockets {list(sockets)} to a new server")
+            self.on_handoff()
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import math
+import struct
+import time
+from collections import deque
+from typing import Callable, Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+AAC_FRAME_SAMPLES = 1024
+ID3_TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+
+
+def _syncsafe(value: int) -> bytes:
+    return bytes(
+        ((value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F)
+    )
+
+
+def id3_timestamp(seconds: float) -> bytes:
+    """ID3 PRIV tag carrying a segment's start time, required for packed audio"""
+    pts = int(seconds * 90000) & ((1 << 33) - 1)
+    payload = ID3_TIMESTAMP_OWNER + struct.pack(">Q", pts)
+    frame = b"PRIV" + _syncsafe(len(payload)) + b"\x00\x00" + payload
+    return b"ID3\x04\x00\x00" + _syncsafe(len(frame)) + frame
+
+
+class Segment:
+    __slots__ = ("sequence", "duration", "data")
+
+    def __init__(self, sequence: int, duration: float, data: bytes):
+        self.sequence = sequence
+        self.duration = duration
+        self.data = data
+
+
+class HlsSegmenter:
+    """Cut a shared AAC encoder's ADTS frames into short HLS segments.
+
+    Segments are built once per stream and kept in a small ring, so every
+    playlist and segment request is answered from memory. The segmenter is
+    just another listener on the stream's AAC encoder and detaches after
+    ``idle_timeout`` seconds without requests.
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        encoder,
+        segment_duration: float = 1.0,
+        segments: int = 6,
+        idle_timeout: float = 30.0,
+        on_idle: Callable[["HlsSegmenter"], None] = None,
+    ):
+        self.stream_id = stream_id
+        self.encoder = encoder
+        self.sample_rate = encoder.codec.sample_rate
+        self.segment_duration = segment_duration
+        self.idle_timeout = idle_timeout
+        self.on_idle = on_idle
+        self.ring: Deque[Segment] = deque(maxlen=segments)
+        self.next_sequence = 0
+        self.samples_written = 0
+        self.ended = False
+        self.changed = asyncio.Condition()
+        self.last_request = time.monotonic()
+        self.listener = encoder.add_listener("hls", max_packets=1024, internal=True)
+        self.task = asyncio.create_task(self._run())
+        logger.info(f"Started HLS segmenter for {stream_id}")
+
+    def touch(self):
+        self.last_request = time.monotonic()
+
+    @property
+    def target_duration(self) -> int:
+        durations = [segment.duration for segment in self.ring]
+        return math.ceil(max(durations, default=self.segment_duration))
+
+    def playlist(self) -> str:
+        first = self.ring[0].sequence if self.ring else self.next_sequence
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:6",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+            f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,"
+            f"HOLD-BACK={self.target_duration * 3:.1f}",
+            f"#EXT-X-MEDIA-SEQUENCE:{first}",
+        ]
+        for segment in self.ring:
+            lines.append(f"#EXTINF:{segment.duration:.3f},")
+            lines.append(f"{segment.sequence}.aac")
+        if self.ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def segment(self, sequence: int) -> Optional[bytes]:
+        for segment in self.ring:
+            if segment.sequence == sequence:
+                return segment.data
+        return None
+
+    async def wait_for_sequence(self, sequence: int, timeout: float):
+        """Blocking playlist reload: wait until ``sequence`` has been cut"""
+        async with self.changed:
+            await asyncio.wait_for(
+                self.changed.wait_for(
+                    lambda: self.next_sequence > sequence or self.ended
+                ),
+                timeout,
+            )
+
+    async def _publish(self, frames: list, samples: int):
+        start = self.samples_written / self.sample_rate
+        data = id3_timestamp(start) + b"".join(frames)
+        self.ring.append(Segment(self.next_sequence, samples / self.sample_rate, data))
+        self.next_sequence += 1
+        self.samples_written += samples
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def _run(self):
+        frames, samples = [], 0
+        per_segment = int(self.segment_duration * self.sample_rate)
+        try:
+            while True:
+                frame = await self.listener.get()
+                if frame is None:
+                    # Stream over: publish the tail and close the playlist
+                    if frames:
+                        await self._publish(frames, samples)
+                    self.ended = True
+                    break
+
+                frames.append(frame)
+                samples += AAC_FRAME_SAMPLES
+                # Cut before exceeding the target so TARGETDURATION stays tight
+                if samples + AAC_FRAME_SAMPLES <= per_segment:
+                    continue
+
+                await self._publish(frames, samples)
+                frames, samples = [], 0
+                if time.monotonic() - self.last_request > self.idle_timeout:
+                    logger.info(f"No HLS requests for {self.stream_id}, stopping")
+                    break
+        finally:
+            async with self.changed:
+                self.changed.notify_all()
+            self.encoder.remove_listener(self.listener)
+            if self.on_idle:
+                self.on_idle(self)
+
+    def stop(self):
+        self.task.cancel()
@@ -0,0 +1,273 @@
+"""Minimal Prometheus text-format metrics.
+
+Children are plain Python objects: hot loops keep a reference to the child
+returned by ``labels()`` and update it with a single attribute increment.
+"""
+
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+Sample = Tuple[str, Dict[str, str], float]
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self.children[key] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        self.children.pop(tuple(str(v) for v in values), None)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[Sample]:
+        for key, child in list(self.children.items()):
+            yield self.name, dict(zip(self.labelnames, key)), child.value
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[Sample]:
+        for key, child in list(self.children.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                yield (
+                    self.name + "_bucket",
+                    dict(labels, le=_format_value(bound)),
+                    cumulative,
+                )
+            yield self.name + "_sum", labels, child.sum
+            yield self.name + "_count", labels, child.count
+
+
+class CallbackMetric:
+    """A metric whose samples are computed by a callback at scrape time"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]],
+        metric_type: str = "gauge",
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.metric_type = metric_type
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self.callback():
+            yield self.name, labels, value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        self.metrics.pop(name, None)
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "".join(line + "\n" for line in lines)
+
+
+REGISTRY = MetricsRegistry()
+
+FRAMES_RECEIVED = REGISTRY.counter(
+    "voice_stream_frames_received_total",
+    "Audio frames received from the stream's sender",
+    ("stream",),
+)
+BYTES_RELAYED = REGISTRY.counter(
+    "voice_stream_bytes_relayed_total",
+    "Encoded audio bytes forwarded to WebRTC receivers",
+    ("stream",),
+)
+ENCODE_SECONDS = REGISTRY.histogram(
+    "voice_stream_encode_seconds",
+    "Time spent resampling and encoding one frame for HTTP listeners",
+    ("stream", "format"),
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+OFFER_ANSWER_SECONDS = REGISTRY.histogram(
+    "voice_signaling_offer_answer_seconds",
+    "Time from receiving (sender) or sending (receiver) an offer to the answer",
+    ("role",),
+)
+FIRST_AUDIO_SECONDS = REGISTRY.histogram(
+    "voice_signaling_first_audio_seconds",
+    "Time from WebSocket connect to the first audio frame for a session",
+    ("role",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "voice_event_loop_lag_seconds",
+    "How late the event loop woke up a periodic timer",
+    buckets=(0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+SILENT_PACKETS = REGISTRY.counter(
+    "voice_encoder_silent_packets_total",
+    "Cached silence packets sent instead of encoding gated frames",
+    ("format",),
+)
+RECORDING_BYTES = REGISTRY.counter(
+    "voice_recording_bytes_written_total",
+    "Encoded bytes handed to the recording writer",
+)
+WS_EVICTIONS = REGISTRY.counter(
+    "voice_ws_evictions_total",
+    "/ws clients closed because a send did not complete within WS_SEND_TIMEOUT",
+)
+HOT_PATH_SECONDS = REGISTRY.histogram(
+    "voice_hot_path_seconds",
+    "Synchronous time spent per iteration of event-loop hot paths",
+    ("section",),
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+MESSAGE_SECONDS = REGISTRY.histogram(
+    "voice_ws_message_seconds",
+    "Time to handle one /ws message, including awaited ICE gathering and sends",
+    ("type",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+PEER_POOL_ACQUIRES = REGISTRY.counter(
+    "voice_peer_pool_acquires_total",
+    "Peer connections handed out, from the warm pool or built on demand",
+    ("source",),
+)
+RELAY_FRAMES_DROPPED = REGISTRY.counter(
+    "voice_relay_frames_dropped_total",
+    "Frames or packets skipped so a lagging consumer catches up",
+    ("policy",),
+)
@@ -0,0 +1,218 @@
+import asyncio
+import fractions
+import logging
+from collections import deque
+from typing import Deque, Optional, Set
+
+import av
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+from metrics import BYTES_RELAYED, RELAY_FRAMES_DROPPED
+from relay_latency import LatencyTrack
+
+logger = logging.getLogger(__name__)
+
+OPUS_MIME_TYPE = "audio/opus"
+OPUS_TIME_BASE = fractions.Fraction(1, 48000)
+OPUS_PACKET_SECONDS = 0.02  # browsers send 20 ms Opus packets
+
+
+class PassthroughTrack(MediaStreamTrack):
+    """Receiver-side track that yields the sender's encoded Opus packets.
+
+    aiortc packs ``av.Packet`` objects returned by ``recv()`` straight into RTP
+    without re-encoding. If the sender or the receiver did not negotiate Opus,
+    the track falls back to a regular relay subscription and yields decoded
+    frames, which aiortc then transcodes as usual.
+
+    The packet queue is bounded either way. With the ``live`` latency policy
+    it holds only ``max_delay`` seconds, so a receiver that stalls skips
+    ahead instead of staying behind. ``lag`` and ``max_lag`` track the
+    backlog as for ``LatencyTrack``.
+    """
+
+    kind = "audio"
+
+    def __init__(
+        self,
+        hub: "OpusPassthrough",
+        relay,
+        source_track,
+        max_packets=50,
+        policy: str = "reliable",
+        max_delay: float = 0.1,
+    ):
+        super().__init__()
+        self.hub = hub
+        self.relay = relay
+        self.source_track = source_track
+        self.policy = policy
+        self.max_delay = max_delay
+        if policy == "live":
+            max_packets = min(max_packets, max(1, int(max_delay / OPUS_PACKET_SECONDS)))
+        self.max_packets = max_packets
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.dropped = 0
+        self.frames_dropped = RELAY_FRAMES_DROPPED.labels(policy)
+        self.packets: Deque[Optional[av.Packet]] = deque()
+        self.ready = asyncio.Event()
+        self.transcoding = False
+        self.started = False
+        self.on_first_frame = None
+        self.relayed = None
+        self._fallback = None
+
+    def count_relayed(self, sender, counter):
+        """Passed on to the transcoding fallback; the hub counts packets"""
+        self.relayed = (sender, counter)
+
+    def push(self, packet: Optional[av.Packet]):
+        if self.transcoding and packet is not None:
+            return
+        if not self.started and packet is not None:
+            # Nothing is consuming yet; don't build up stale audio
+            return
+        if len(self.packets) >= self.max_packets:
+            # Keep latency bounded for receivers that cannot keep up
+            self.packets.popleft()
+            self.dropped += 1
+            self.frames_dropped.inc()
+        self.packets.append(packet)
+        self.ready.set()
+
+    def use_transcoding(self):
+        if not self.transcoding:
+            self.transcoding = True
+            self.packets.clear()
+            self.ready.set()
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        self.started = True
+        while not self.transcoding and not self.packets:
+            self.ready.clear()
+            await self.ready.wait()
+
+        if self.transcoding:
+            if self._fallback is None:
+                logger.info(
+                    f"Receiver on {self.hub.stream_id} falling back to transcoding"
+                )
+                self._fallback = LatencyTrack(
+                    self.relay, self.source_track, self.policy, self.max_delay
+                )
+                if self.relayed is not None:
+                    self._fallback.count_relayed(*self.relayed)
+            data = await self._fallback.recv()
+            self.lag = self._fallback.lag
+        else:
+            data = self.packets.popleft()
+            if data is None:
+                self.stop()
+                raise MediaStreamError
+            self.lag = len(self.packets) * OPUS_PACKET_SECONDS
+        if self.lag > self.max_lag:
+            self.max_lag = self.lag
+
+        if self.on_first_frame is not None:
+            callback, self.on_first_frame = self.on_first_frame, None
+            callback()
+        return data
+
+    def stop(self):
+        super().stop()
+        self.hub.unsubscribe(self)
+        if self._fallback is not None:
+            self._fallback.stop()
+            self._fallback = None
+
+
+class OpusPassthrough:
+    """Forward a sender's encoded Opus frames to all receivers of a stream.
+
+    The sender's frames are still decoded once (for MP3, visualization and
+    any transcoding fallback), but receivers no longer run one Opus encoder
+    each: the encoded payload is tapped from the RTP receiver and shared.
+    """
+
+    def __init__(self, stream_id: str, receiver):
+        self.stream_id = stream_id
+        self.receiver = receiver
+        self.tracks: Set[PassthroughTrack] = set()
+        self.codec_mismatch = False
+        self.attached = False
+        self.bytes_relayed = BYTES_RELAYED.labels(stream_id)
+
+    def attach(self) -> bool:
+        """Tee the receiver's decoder queue so encoded frames reach us too"""
+        decoder_queue = getattr(self.receiver, "_RTCRtpReceiver__decoder_queue", None)
+        if decoder_queue is None:
+            logger.warning(
+                f"Opus passthrough unavailable for {self.stream_id}: "
+                "unsupported aiortc version"
+            )
+            return False
+
+        original_put = decoder_queue.put
+
+        def put(item, *args, **kwargs):
+            self._on_encoded_frame(item)
+            original_put(item, *args, **kwargs)
+
+        decoder_queue.put = put
+        self.attached = True
+        return True
+
+    def subscribe(self, relay, source_track, **options) -> PassthroughTrack:
+        track = PassthroughTrack(self, relay, source_track, **options)
+        if self.codec_mismatch:
+            track.use_transcoding()
+        self.tracks.add(track)
+        return track
+
+    def unsubscribe(self, track: PassthroughTrack):
+        self.tracks.discard(track)
+
+    def _on_encoded_frame(self, item):
+        if item is None:
+            # Decoder is stopping: the sender has gone away
+            for track in list(self.tracks):
+                track.push(None)
+            return
+
+        if not self.tracks or self.codec_mismatch:
+            return
+
+        codec, encoded_frame = item
+        if codec.mimeType.lower() != OPUS_MIME_TYPE:
+            logger.info(
+                f"Sender on {self.stream_id} uses {codec.mimeType}, "
+                "disabling Opus passthrough"
+            )
+            self.codec_mismatch = True
+            for track in list(self.tracks):
+                track.use_transcoding()
+            return
+
+        packet = av.Packet(encoded_frame.data)
+        packet.pts = encoded_frame.timestamp
+        packet.time_base = OPUS_TIME_BASE
+        forwarded = 0
+        for track in list(self.tracks):
+            if track.started and not track.transcoding:
+                track.push(packet)
+                forwarded += 1
+        self.bytes_relayed.inc(len(encoded_frame.data) * forwarded)
+
+
+def negotiated_opus(pc, track) -> bool:
+    """Whether the transceiver sending ``track`` negotiated Opus as its codec"""
+    for transceiver in pc.getTransceivers():
+        if transceiver.sender.track is track:
+            codecs = getattr(transceiver, "_codecs", None)
+            return bool(codecs) and codecs[0].mimeType.lower() == OPUS_MIME_TYPE
+    return False
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional, Set
+
+from metrics import HOT_PATH_SECONDS
+from stream_encoder import StreamListener
+
+logger = logging.getLogger(__name__)
+
+TAP_SAMPLE_RATES = (8000, 16000, 24000, 32000, 48000)
+TAP_FRAME_MS = 20
+
+
+class SharedTap:
+    """Resample one relayed track to raw s16 PCM once and fan it out.
+
+    One tap exists per stream and output format; every ``/tap`` client asking
+    for that format shares its relay subscription and resampler. Resampling
+    20 ms of audio is cheap enough to run on the event loop. Frames are handed
+    to listeners as ``memoryview`` slices of the resampled frame's plane, so
+    nothing is copied between the resampler and the socket.
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        relay,
+        source_track,
+        sample_rate: int = 16000,
+        channels: int = 1,
+        on_idle: Callable[["SharedTap"], None] = None,
+    ):
+        self.stream_id = stream_id
+        self.relay = relay
+        self.source_track = source_track
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.on_idle = on_idle
+        self.frame_samples = sample_rate * TAP_FRAME_MS // 1000
+        self.listeners: Set[StreamListener] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.track = None
+        self.finished = False
+
+    @property
+    def key(self):
+        return (self.stream_id, self.sample_rate, self.channels)
+
+    def add_listener(self, remote: str = None, **options) -> StreamListener:
+        listener = StreamListener(remote, **options)
+        self.listeners.add(listener)
+        if self.finished:
+            listener.push(None)
+        elif self.task is None:
+            self.track = self.relay.subscribe(self.source_track)
+            self.task = asyncio.create_task(self._run())
+            logger.info(
+                f"Started {self.sample_rate} Hz/{self.channels}ch PCM tap "
+                f"for {self.stream_id}"
+            )
+        return listener
+
+    def remove_listener(self, listener: StreamListener):
+        self.listeners.discard(listener)
+        if not self.listeners:
+            self.stop()
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.track is not None:
+            self.track.stop()
+            self.track = None
+            logger.info(f"Stopped PCM tap for {self.stream_id}")
+        if self.on_idle:
+            self.on_idle(self)
+
+    def _broadcast(self, data):
+        for listener in list(self.listeners):
+            listener.push(data)
+
+    async def _run(self):
+        import av
+
+        track = self.track
+        resampler = av.AudioResampler(
+            format="s16",
+            layout="mono" if self.channels == 1 else "stereo",
+            rate=self.sample_rate,
+            frame_size=self.frame_samples,
+        )
+        bytes_per_sample = 2 * self.channels
+        hot_path_seconds = HOT_PATH_SECONDS.labels("pcm_tap")
+        try:
+            while True:
+                try:
+                    frame = await track.recv()
+                except Exception as e:
+                    logger.info(f"Tap source {self.stream_id} ended: {e}")
+                    break
+
+                started = time.perf_counter()
+                for out in resampler.resample(frame):
+                    # Planes can be padded; slice to the samples actually present
+                    self._broadcast(
+                        memoryview(out.planes[0])[: out.samples * bytes_per_sample]
+                    )
+                hot_path_seconds.observe(time.perf_counter() - started)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"PCM tap error for {self.stream_id}: {e}")
+
+        self.finished = True
+        self._broadcast(None)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from aiortc import RTCConfiguration, RTCPeerConnection, rtcpeerconnection
+from aiortc.rtcdtlstransport import RTCCertificate
+
+from metrics import PEER_POOL_ACQUIRES
+
+logger = logging.getLogger(__name__)
+
+
+class CertificateStore:
+    """One DTLS certificate shared by every peer connection, rotated on a schedule.
+
+    aiortc generates a fresh ECDSA key and self-signed certificate for every
+    ``RTCPeerConnection``. While installed, the store hands out its current
+    certificate instead, so a new connection costs no key generation.
+    Replacement certificates are generated off the event loop. Connections
+    already established keep the certificate they negotiated with.
+    """
+
+    def __init__(self, rotate_interval: float = 86400.0):
+        self.rotate_interval = rotate_interval
+        self.certificate: Optional[RTCCertificate] = None
+        self.created = 0.0
+        self.installed = False
+
+    def current(self) -> RTCCertificate:
+        if self.certificate is None:
+            self.certificate = RTCCertificate.generateCertificate()
+            self.created = time.monotonic()
+        return self.certificate
+
+    @property
+    def due(self) -> bool:
+        return time.monotonic() - self.created >= self.rotate_interval
+
+    async def rotate(self):
+        loop = asyncio.get_running_loop()
+        self.certificate = await loop.run_in_executor(
+            None, RTCCertificate.generateCertificate
+        )
+        self.created = time.monotonic()
+        logger.info(
+            f"Rotated DTLS certificate, valid until {self.certificate.expires:%Y-%m-%d}"
+        )
+
+    def install(self) -> bool:
+        """Make every RTCPeerConnection created from now on use this store"""
+        if not hasattr(rtcpeerconnection, "RTCCertificate"):
+            logger.warning("Shared DTLS certificate unavailable: unsupported aiortc")
+            return False
+
+        store = self
+
+        class SharedCertificate(RTCCertificate):
+            @classmethod
+            def generateCertificate(cls):
+                return store.current()
+
+        rtcpeerconnection.RTCCertificate = SharedCertificate
+        self.installed = True
+        return True
+
+
+class PeerConnectionPool:
+    """Keep a few peer connections ready before anyone asks for one.
+
+    A pooled connection already has its audio transceiver and a DTLS
+    transport, and its ICE host candidates are gathered. The transceiver is
+    ``recvonly``: a sender's offer binds to it, and ``addTrack()`` on a
+    receiver turns it into ``sendrecv``. Either way the SDP is the same as
+    for a connection built from scratch, but ``createOffer``/``createAnswer``
+    skip gathering. The pool refills in the background after each
+    ``acquire()`` and is rebuilt whenever the certificate rotates, so pooled
+    connections never hold a retired certificate or stale candidates.
+    """
+
+    def __init__(
+        self,
+        certificates: CertificateStore,
+        size: int = 4,
+        configuration: RTCConfiguration = None,
+    ):
+        self.certificates = certificates
+        self.size = size
+        self.configuration = configuration or RTCConfiguration(iceServers=[])
+        self.idle: List[RTCPeerConnection] = []
+        self.task: Optional[asyncio.Task] = None
+        self._refill = asyncio.Event()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self._drain()
+
+    def acquire(self) -> RTCPeerConnection:
+        """Return a warm connection, or a cold one when the pool is empty"""
+        self._refill.set()
+        while self.idle:
+            pc = self.idle.pop()
+            if pc.connectionState != "closed":
+                PEER_POOL_ACQUIRES.labels("warm").inc()
+                return pc
+        PEER_POOL_ACQUIRES.labels("cold").inc()
+        return RTCPeerConnection(configuration=self.configuration)
+
+    async def _prepare(self) -> RTCPeerConnection:
+        pc = RTCPeerConnection(configuration=self.configuration)
+        transceiver = pc.addTransceiver("audio", direction="recvonly")
+        await transceiver.receiver.transport.transport.iceGatherer.gather()
+        return pc
+
+    async def _drain(self):
+        idle, self.idle = self.idle, []
+        for pc in idle:
+            await pc.close()
+
+    async def _run(self):
+        while True:
+            try:
+                if self.certificates.installed and self.certificates.due:
+                    await self.certificates.rotate()
+                    await self._drain()
+                while len(self.idle) < self.size:
+                    self.idle.append(await self._prepare())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to prepare pooled peer connection: {e}")
+
+            self._refill.clear()
+            timeout = self.certificates.rotate_interval
+            if self.certificates.installed:
+                timeout = max(
+                    1.0,
+                    self.certificates.created + timeout - time.monotonic(),
+                )
+            try:
+                await asyncio.wait_for(self._refill.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from metrics import RECORDING_BYTES
+
+logger = logging.getLogger(__name__)
+
+RECORDING_EXTENSIONS = (".mp3", ".aac")
+
+
+class _OpenSegment:
+    __slots__ = ("file", "path", "seconds")
+
+    def __init__(self, file, path: str):
+        self.file = file
+        self.path = path
+        self.seconds = 0.0
+
+
+class RecordingWriter(threading.Thread):
+    """Background thread owning every recording file.
+
+    The event loop only enqueues packets; opening, writing, rotating and
+    deleting files all happen here. Files are opened with a large buffer, so
+    the kernel sees a few big writes instead of one per packet. Buffers are
+    flushed every ``flush_interval`` seconds so a crash loses little audio.
+
+    Each stream gets a new file every ``segment_seconds`` of audio, under
+    ``directory/<stream_id>/``. After every rotation, files older than
+    ``retention_seconds`` are deleted, and the oldest files are deleted until
+    the total is under ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_seconds: float = 300.0,
+        retention_seconds: float = 86400.0,
+        max_bytes: int = 1 << 30,
+        buffer_size: int = 1 << 20,
+        flush_interval: float = 5.0,
+    ):
+        super().__init__(name="recording-writer", daemon=True)
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.retention_seconds = retention_seconds
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.segments: Dict[str, _OpenSegment] = {}
+
+    def write(self, stream_id: str, extension: str, data: bytes, seconds: float):
+        self.queue.put(("write", stream_id, extension, data, seconds))
+
+    def close_stream(self, stream_id: str):
+        self.queue.put(("close", stream_id))
+
+    def shutdown(self):
+        self.queue.put(None)
+        self.join(timeout=10)
+
+    def run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._enforce_retention()
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            try:
+                if item and item[0] == "write":
+                    self._write(*item[1:])
+                elif item and item[0] == "close":
+                    self._close(item[1])
+                    self._enforce_retention()
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    for segment in self.segments.values():
+                        segment.file.flush()
+                    last_flush = time.monotonic()
+            except OSError as e:
+                logger.error(f"Recording I/O error: {e}")
+
+        for stream_id in list(self.segments):
+            self._close(stream_id)
+
+    def _write(self, stream_id: str, extension: str, data: bytes, seconds: float):
+        segment = self.segments.get(stream_id)
+        if segment is not None and segment.seconds >= self.segment_seconds:
+            self._close(stream_id)
+            self._enforce_retention()
+            segment = None
+        if segment is None:
+            stream_dir = os.path.join(self.directory, stream_id)
+            os.makedirs(stream_dir, exist_ok=True)
+            name = time.strftime("%Y%m%d-%H%M%S") + extension
+            path = os.path.join(stream_dir, name)
+            segment = _OpenSegment(open(path, "ab", buffering=self.buffer_size), path)
+            self.segments[stream_id] = segment
+            logger.info(f"Recording {stream_id} to {path}")
+        segment.file.write(data)
+        segment.seconds += seconds
+        RECORDING_BYTES.inc(len(data))
+
+    def _close(self, stream_id: str):
+        segment = self.segments.pop(stream_id, None)
+        if segment is not None:
+            segment.file.close()
+
+    def _enforce_retention(self):
+        open_paths = {segment.path for segment in self.segments.values()}
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(RECORDING_EXTENSIONS) and path not in open_paths:
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        cutoff = time.time() - self.retention_seconds
+        for mtime, size, path in files:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            logger.info(f"Deleted old recording {path}")
+
+        for root, dirs, names in os.walk(self.directory, topdown=False):
+            if root != self.directory and not dirs and not names:
+                os.rmdir(root)
+
+
+class StreamRecorder:
+    """Record a stream by listening to its shared encoder.
+
+    The recorder is one more listener on the encoder the HTTP path already
+    runs, so recording adds file writes but no encoding. It ends on its own
+    when the stream does.
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        encoder,
+        writer: RecordingWriter,
+        on_done: Callable[["StreamRecorder"], None] = None,
+    ):
+        self.stream_id = stream_id
+        self.encoder = encoder
+        self.writer = writer
+        self.on_done = on_done
+        self.extension = "." + encoder.output_format
+        self.packet_seconds = encoder.codec.packet_samples / encoder.codec.sample_rate
+        self.listener = encoder.add_listener(
+            "recorder", max_packets=1024, internal=True
+        )
+        self.task: Optional[asyncio.Task] = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                packet = await self.listener.get()
+                if packet is None:
+                    break
+                self.writer.write(
+                    self.stream_id, self.extension, packet, self.packet_seconds
+                )
+        finally:
+            self.writer.close_stream(self.stream_id)
+            self.encoder.remove_listener(self.listener)
+            if self.on_done:
+                self.on_done(self)
+
+    def stop(self):
+        self.task.cancel()
@@ -0,0 +1,102 @@
+import logging
+
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+from metrics import RELAY_FRAMES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+LATENCY_POLICIES = ("live", "reliable")
+
+
+def sent_bytes(sender):
+    """RTP payload bytes an ``RTCRtpSender`` has sent, or None if unknown"""
+    return getattr(sender, "_RTCRtpSender__octet_count", None)
+
+
+class LatencyTrack(MediaStreamTrack):
+    """A MediaRelay subscription with a per-consumer latency policy.
+
+    Both policies read from aiortc's buffered relay. With ``reliable`` every
+    frame is delivered, so a consumer that stalls comes back late and stays
+    late. ``live`` adds a trim step: every ``recv()`` drops the oldest frames
+    until at most ``max_delay`` seconds are queued, which keeps two-way audio
+    conversational at the cost of a glitch. Every discarded frame counts in
+    ``dropped``. Either way ``lag`` is the backlog left after the last
+    ``recv()`` and ``max_lag`` the worst seen.
+    """
+
+    kind = "audio"
+
+    def __init__(self, relay, source, policy: str = "reliable", max_delay=0.1):
+        super().__init__()
+        if policy not in LATENCY_POLICIES:
+            raise ValueError(f"Unknown latency policy: {policy}")
+        self.policy = policy
+        self.max_delay = max_delay
+        self.proxy = relay.subscribe(source)
+        # The buffered proxy's queue is where a slow consumer's backlog lives
+        self.queue = getattr(self.proxy, "_queue", None)
+        if self.queue is None:
+            logger.warning("Relay lag tracking unavailable: unsupported aiortc")
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.dropped = 0
+        self.frames_dropped = RELAY_FRAMES_DROPPED.labels(policy)
+        self.sender = None
+        self.bytes_relayed = None
+        self._sent = 0
+
+    def count_relayed(self, sender, counter):
+        """Add the bytes ``sender`` encodes from this track to ``counter``.
+
+        aiortc encodes a frame after ``recv()`` returns it, so each call picks
+        up what the sender has put on the wire since the previous one.
+        """
+        self._sent = sent_bytes(sender)
+        if self._sent is None:
+            logger.warning("Relayed byte count unavailable: unsupported aiortc")
+            return
+        self.sender = sender
+        self.bytes_relayed = counter
+
+    def _count_sent(self):
+        if self.sender is not None:
+            sent = sent_bytes(self.sender)
+            self.bytes_relayed.inc(sent - self._sent)
+            self._sent = sent
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        self._count_sent()
+        frame = await self.proxy.recv()
+        if self.queue is None or not frame.sample_rate:
+            return frame
+
+        duration = frame.samples / frame.sample_rate
+        backlog = self.queue.qsize()
+        if self.policy == "live" and backlog * duration > self.max_delay:
+            keep = int(self.max_delay / duration)
+            while backlog > keep:
+                # Discard the frame in hand for the next one in the queue
+                self.dropped += 1
+                self.frames_dropped.inc()
+                frame = self.queue.get_nowait()
+                backlog -= 1
+                if frame is None:
+                    # The source ended while we were behind
+                    self.stop()
+                    raise MediaStreamError
+
+        self.lag = backlog * duration
+        if self.lag > self.max_lag:
+            self.max_lag = self.lag
+        return frame
+
+    def stop(self):
+        self._count_sent()
+        super().stop()
+        self.proxy.stop()
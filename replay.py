@@ -0,0 +1,174 @@
+import asyncio
+import bisect
+import logging
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_replay_time(value: str, now: float) -> float:
+    """``-60s`` or ``-60`` means a minute ago; anything else is a Unix time"""
+    seconds = float(value[:-1] if value.endswith("s") else value)
+    if not math.isfinite(seconds):
+        raise ValueError(f"Not a finite time: {value}")
+    return now + seconds if seconds <= 0 else seconds
+
+
+class ReplayChunk:
+    """Joined packets plus ``marks``: ``(ms, end_offset)`` for each arrival
+    burst, so a range can end partway through the chunk"""
+
+    __slots__ = ("start_ms", "seconds", "data", "marks")
+
+    def __init__(
+        self,
+        start_ms: int,
+        seconds: float,
+        data: bytes,
+        marks: List[Tuple[int, int]],
+    ):
+        self.start_ms = start_ms
+        self.seconds = seconds
+        self.data = data
+        self.marks = marks
+
+    def until(self, end_ms: int) -> "ReplayChunk":
+        """The part of the chunk that had arrived before ``end_ms``"""
+        if self.marks[-1][0] < end_ms:
+            return self
+        index = bisect.bisect_left(self.marks, end_ms, key=lambda mark: mark[0])
+        size = self.marks[index - 1][1] if index else 0
+        return ReplayChunk(self.start_ms, 0.0, self.data[:size], self.marks[:index])
+
+
+class ReplayBuffer:
+    """The last ``window_seconds`` of a stream, kept as encoded MP3 packets.
+
+    The buffer is one more listener on the stream's shared MP3 encoder, so
+    it costs memory but no encoding. Packets are joined into chunks of about
+    ``chunk_seconds``, each indexed by the wall-clock time of its first
+    packet. The encoder writes packets without the bit reservoir, so any
+    chunk boundary is a valid place to start playback. After the stream
+    ends the buffer stays readable for one more window.
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        encoder,
+        window_seconds: float = 300.0,
+        chunk_seconds: float = 1.0,
+        on_done: Callable[["ReplayBuffer"], None] = None,
+    ):
+        self.stream_id = stream_id
+        self.encoder = encoder
+        self.window_seconds = window_seconds
+        self.chunk_seconds = chunk_seconds
+        self.on_done = on_done
+        self.packet_seconds = encoder.codec.packet_samples / encoder.codec.sample_rate
+        self.chunks: Deque[ReplayChunk] = deque()
+        self.seconds = 0.0
+        self.bytes = 0
+        self.pending: List[bytes] = []
+        self.pending_marks: List[Tuple[int, int]] = []
+        self.pending_bytes = 0
+        self.ended = False
+        self.listener = encoder.add_listener("replay", max_packets=1024, internal=True)
+        self.task: Optional[asyncio.Task] = asyncio.create_task(self._run())
+
+    def _pending_chunk(self) -> Optional[ReplayChunk]:
+        if not self.pending:
+            return None
+        return ReplayChunk(
+            self.pending_marks[0][0],
+            len(self.pending) * self.packet_seconds,
+            b"".join(self.pending),
+            list(self.pending_marks),
+        )
+
+    def _seal(self):
+        chunk = self._pending_chunk()
+        if chunk is None:
+            return
+        self.pending = []
+        self.pending_marks = []
+        self.pending_bytes = 0
+        self.chunks.append(chunk)
+        self.seconds += chunk.seconds
+        self.bytes += len(chunk.data)
+        while (
+            self.chunks and self.seconds - self.chunks[0].seconds >= self.window_seconds
+        ):
+            oldest = self.chunks.popleft()
+            self.seconds -= oldest.seconds
+            self.bytes -= len(oldest.data)
+
+    def add(self, packet: bytes):
+        now_ms = int(time.time() * 1000)
+        self.pending.append(packet)
+        self.pending_bytes += len(packet)
+        if self.pending_marks and self.pending_marks[-1][0] == now_ms:
+            # Packets of one encoded batch arrive together; one mark covers them
+            self.pending_marks[-1] = (now_ms, self.pending_bytes)
+        else:
+            self.pending_marks.append((now_ms, self.pending_bytes))
+        if len(self.pending) * self.packet_seconds >= self.chunk_seconds:
+            self._seal()
+
+    def snapshot(
+        self, start: float, end: Optional[float] = None
+    ) -> Tuple[List[ReplayChunk], int, int]:
+        """Chunks from the one holding ``start`` up to ``end`` (default: now).
+
+        Returns the chunks with the start and end of the range they cover, in
+        milliseconds. Packets that arrived at or after the end are left out,
+        so asking again with those two values gives the same bytes for as
+        long as the first chunk is still buffered. The chunk being filled is
+        read as it stands, without sealing it.
+        """
+        now_ms = int(time.time() * 1000)
+        end_ms = min(int(end * 1000), now_ms) if end is not None else now_ms
+        chunks = list(self.chunks)
+        pending = self._pending_chunk()
+        if pending is not None:
+            chunks.append(pending)
+        stop = bisect.bisect_left(chunks, end_ms, key=lambda chunk: chunk.start_ms)
+        first = bisect.bisect_right(
+            chunks, int(start * 1000), 0, stop, key=lambda chunk: chunk.start_ms
+        )
+        chunks = chunks[max(first - 1, 0) : stop]
+        if not chunks:
+            return [], end_ms, end_ms
+        chunks[-1] = chunks[-1].until(end_ms)
+        return chunks, chunks[0].start_ms, end_ms
+
+    def stats(self) -> dict:
+        return {
+            "seconds": round(self.seconds, 1),
+            "bytes": self.bytes,
+            "chunks": len(self.chunks),
+            "ended": self.ended,
+        }
+
+    async def _run(self):
+        try:
+            try:
+                while True:
+                    packet = await self.listener.get()
+                    if packet is None:
+                        break
+                    self.add(packet)
+            finally:
+                self._seal()
+                self.ended = True
+                self.encoder.remove_listener(self.listener)
+            await asyncio.sleep(self.window_seconds)
+        finally:
+            if self.on_done:
+                self.on_done(self)
+
+    def stop(self):
+        self.task.cancel()
@@ -0,0 +1,223 @@
+import asyncio
+import fractions
+import logging
+import time
+from typing import Dict
+
+import av
+import numpy as np
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 48000
+FRAME_SAMPLES = 960  # 20 ms, the same cadence aiortc's Opus path uses
+INT16_MAX = 32767.0
+
+
+class SampleFifo:
+    """Fixed-size int16 ring; overflowing drops the oldest samples"""
+
+    def __init__(self, capacity: int):
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.read_pos = 0
+        self.size = 0
+        self.dropped = 0
+
+    def write(self, samples: np.ndarray):
+        capacity = self.buffer.size
+        if samples.size > capacity:
+            samples = samples[-capacity:]
+        count = samples.size
+        overflow = self.size + count - capacity
+        if overflow > 0:
+            self.read_pos = (self.read_pos + overflow) % capacity
+            self.size -= overflow
+            self.dropped += overflow
+
+        start = (self.read_pos + self.size) % capacity
+        first = min(count, capacity - start)
+        self.buffer[start : start + first] = samples[:first]
+        self.buffer[: count - first] = samples[first:]
+        self.size += count
+
+    def read_into(self, out: np.ndarray) -> int:
+        """Fill ``out`` from the ring, zero-padding on underrun"""
+        count = min(out.size, self.size)
+        capacity = self.buffer.size
+        first = min(count, capacity - self.read_pos)
+        out[:first] = self.buffer[self.read_pos : self.read_pos + first]
+        out[first:count] = self.buffer[: count - first]
+        out[count:] = 0
+        self.read_pos = (self.read_pos + count) % capacity
+        self.size -= count
+        return count
+
+
+class MixerInput:
+    __slots__ = (
+        "stream_id",
+        "source",
+        "track",
+        "gain",
+        "fifo",
+        "primed",
+        "resampler",
+        "task",
+        "ended",
+    )
+
+    def __init__(self, stream_id: str, source, gain: float, capacity: int):
+        self.stream_id = stream_id
+        self.source = source
+        self.track = None
+        self.gain = gain
+        self.fifo = SampleFifo(capacity)
+        self.primed = False
+        self.resampler = av.AudioResampler(
+            format="s16", layout="mono", rate=SAMPLE_RATE
+        )
+        self.task = None
+        self.ended = False
+
+
+class MixerTrack(MediaStreamTrack):
+    """48 kHz track mixing several relayed sender tracks.
+
+    Each input is decoded into its own sample FIFO by a reader task with its
+    own relay subscription. Readers start on the first ``recv()`` and stop
+    when the room's last relay subscriber leaves, so a room without consumers
+    decodes and resamples nothing. Every
+    20 ms ``recv()`` pulls one frame's worth of samples from every primed
+    input and mixes them with a single matrix product, so the per-frame cost
+    is a few small NumPy operations regardless of where the inputs came from.
+    FIFOs hold at most ``max_delay`` seconds; a slow or bursty input loses its
+    oldest audio rather than delaying the room.
+
+    Mixing is done in mono; the result is duplicated into stereo because the
+    downstream encoders would otherwise upmix it 3 dB below the senders.
+    """
+
+    kind = "audio"
+
+    def __init__(self, relay, max_delay: float = 0.2, limit: float = 0.9):
+        super().__init__()
+        self.relay = relay
+        self.inputs: Dict[str, MixerInput] = {}
+        self.capacity = max(int(max_delay * SAMPLE_RATE), FRAME_SAMPLES * 2)
+        self.limit = limit * INT16_MAX
+        self.limiter_gain = 1.0
+        self.time_base = fractions.Fraction(1, SAMPLE_RATE)
+        self._start = None
+        self._pts = 0
+        self._silence = np.zeros((1, FRAME_SAMPLES * 2), dtype=np.int16)
+
+    def add_input(self, stream_id: str, source, gain: float = 1.0):
+        self.remove_input(stream_id)
+        mixer_input = MixerInput(stream_id, source, gain, self.capacity)
+        self.inputs[stream_id] = mixer_input
+        if self._consumed():
+            self._start_input(mixer_input)
+        logger.info(f"Mixing {stream_id} into room ({len(self.inputs)} inputs)")
+
+    def remove_input(self, stream_id: str):
+        mixer_input = self.inputs.pop(stream_id, None)
+        if mixer_input is not None and mixer_input.task is not None:
+            mixer_input.task.cancel()
+
+    def _consumed(self) -> bool:
+        # aiortc's relay keeps pulling a source after its last subscriber
+        # leaves, so recv() alone does not mean anybody is listening
+        proxies = getattr(self.relay, "_MediaRelay__proxies", None)
+        return proxies is None or bool(proxies.get(self))
+
+    def _start_input(self, mixer_input: MixerInput):
+        mixer_input.fifo.read_pos = mixer_input.fifo.size = 0
+        mixer_input.primed = False
+        mixer_input.track = self.relay.subscribe(mixer_input.source)
+        mixer_input.task = asyncio.create_task(self._read(mixer_input))
+
+    def set_gain(self, stream_id: str, gain: float) -> bool:
+        mixer_input = self.inputs.get(stream_id)
+        if mixer_input is None:
+            return False
+        mixer_input.gain = gain
+        return True
+
+    async def _read(self, mixer_input: MixerInput):
+        try:
+            while self._consumed():
+                frame = await mixer_input.track.recv()
+                for out in mixer_input.resampler.resample(frame):
+                    mixer_input.fifo.write(out.to_ndarray().reshape(-1))
+        except MediaStreamError:
+            mixer_input.ended = True
+        except Exception as e:
+            mixer_input.ended = True
+            logger.warning(f"Room input {mixer_input.stream_id} failed: {e}")
+        finally:
+            mixer_input.track.stop()
+            mixer_input.task = None
+
+    def mix(self) -> np.ndarray:
+        """Mix one interleaved stereo frame from every input with enough audio"""
+        ready = []
+        for mixer_input in self.inputs.values():
+            # Wait for two frames before (re)starting an input to absorb jitter
+            threshold = FRAME_SAMPLES if mixer_input.primed else 2 * FRAME_SAMPLES
+            mixer_input.primed = mixer_input.fifo.size >= threshold
+            if mixer_input.primed:
+                ready.append(mixer_input)
+        if not ready:
+            return self._silence
+
+        block = np.empty((len(ready), FRAME_SAMPLES), dtype=np.float32)
+        for row, mixer_input in zip(block, ready):
+            mixer_input.fifo.read_into(row)
+        gains = np.fromiter((i.gain for i in ready), dtype=np.float32, count=len(ready))
+        mixed = gains @ block
+
+        # Peak limiter: duck quickly on overs, recover over ~0.5 s
+        peak = float(np.abs(mixed).max())
+        target = min(1.0, self.limit / peak) if peak > 0 else 1.0
+        if target < self.limiter_gain:
+            self.limiter_gain = target
+        else:
+            self.limiter_gain = min(target, self.limiter_gain + 0.04)
+        if self.limiter_gain < 1.0:
+            mixed *= self.limiter_gain
+
+        np.clip(mixed, -INT16_MAX - 1, INT16_MAX, out=mixed)
+        return np.repeat(mixed.astype(np.int16), 2).reshape(1, -1)
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        if self._consumed():
+            for mixer_input in self.inputs.values():
+                if mixer_input.task is None and not mixer_input.ended:
+                    self._start_input(mixer_input)
+
+        if self._start is None:
+            self._start = time.time()
+        else:
+            self._pts += FRAME_SAMPLES
+            wait = self._start + self._pts / SAMPLE_RATE - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            elif wait < -0.5:
+                # The loop stalled; resync instead of bursting to catch up
+                self._start = time.time() - self._pts / SAMPLE_RATE
+
+        frame = av.AudioFrame.from_ndarray(self.mix(), format="s16", layout="stereo")
+        frame.sample_rate = SAMPLE_RATE
+        frame.pts = self._pts
+        frame.time_base = self.time_base
+        return frame
+
+    def stop(self):
+        for stream_id in list(self.inputs):
+            self.remove_input(stream_id)
+        super().stop()
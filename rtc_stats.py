@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OPUS_CLOCK_RATE = 48000  # RTP timestamp units used for jitter
+
+
+class ConnectionQuality:
+    """Rolling link quality for one peer connection, as seen by the server.
+
+    For a sender the server is the receiving end, so loss and jitter come from
+    its own inbound RTP counters. For a receiver they come from the client's
+    RTCP receiver reports, which also give the round-trip time. Values are
+    smoothed with an exponential moving average across polls.
+    """
+
+    __slots__ = (
+        "connection_id",
+        "role",
+        "stream_id",
+        "loss",
+        "jitter",
+        "rtt",
+        "bitrate",
+        "updated",
+        "_packets",
+        "_lost",
+        "_bytes",
+    )
+
+    def __init__(self, connection_id: str, role: str, stream_id: Optional[str]):
+        self.connection_id = connection_id
+        self.role = role
+        self.stream_id = stream_id
+        self.loss = 0.0
+        self.jitter = 0.0
+        self.rtt: Optional[float] = None
+        self.bitrate = 0.0
+        self.updated = None
+        self._packets = self._lost = self._bytes = None
+
+    def update(self, report, smoothing: float):
+        now = time.monotonic()
+        elapsed = now - self.updated if self.updated else None
+        loss = jitter = rtt = None
+        total_bytes = 0
+        for stats in report.values():
+            if stats.type == "inbound-rtp":
+                jitter = stats.jitter / OPUS_CLOCK_RATE
+                if self._packets is not None:
+                    received = stats.packetsReceived - self._packets
+                    lost = max(0, stats.packetsLost - self._lost)
+                    if received + lost > 0:
+                        loss = lost / (received + lost)
+                self._packets, self._lost = stats.packetsReceived, stats.packetsLost
+            elif stats.type == "remote-inbound-rtp":
+                loss = stats.fractionLost / 256
+                jitter = stats.jitter / OPUS_CLOCK_RATE
+                rtt = stats.roundTripTime
+            elif stats.type == "outbound-rtp":
+                if self.role != "sender":
+                    total_bytes += stats.bytesSent
+            elif stats.type == "transport" and self.role == "sender":
+                # Inbound RTP stats carry no byte count; use the transport's
+                total_bytes += stats.bytesReceived
+
+        if loss is not None:
+            self.loss += smoothing * (loss - self.loss)
+        if jitter is not None:
+            self.jitter += smoothing * (jitter - self.jitter)
+        if rtt is not None:
+            self.rtt = (
+                rtt if self.rtt is None else self.rtt + smoothing * (rtt - self.rtt)
+            )
+        if elapsed and self._bytes is not None:
+            self.bitrate = max(0, total_bytes - self._bytes) * 8 / elapsed
+        self._bytes = total_bytes
+        self.updated = now
+
+    def summary(self) -> dict:
+        return {
+            "connection_id": self.connection_id,
+            "role": self.role,
+            "stream_id": self.stream_id,
+            "loss": round(self.loss, 4),
+            "jitter_ms": round(self.jitter * 1000, 1),
+            "rtt_ms": round(self.rtt * 1000, 1) if self.rtt is not None else None,
+            "bitrate_kbps": round(self.bitrate / 1000, 1),
+        }
+
+
+class QualityMonitor:
+    """Poll ``pc.getStats()`` for every connected peer on an adaptive interval.
+
+    All peers are polled together, then the interval is stretched so the
+    server spends at most ``polls_per_second`` getStats calls per second:
+    ``base_interval`` for a handful of peers, up to ``max_interval`` at scale.
+    After each round ``on_report`` receives the per-stream summaries; it must
+    not block, or it would hold back the next poll.
+    """
+
+    def __init__(
+        self,
+        connections: Dict[str, dict],
+        base_interval: float = 2.0,
+        max_interval: float = 30.0,
+        polls_per_second: float = 20.0,
+        smoothing: float = 0.3,
+        on_report: Callable[[Dict[str, dict]], None] = None,
+    ):
+        self.connections = connections
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.polls_per_second = polls_per_second
+        self.smoothing = smoothing
+        self.on_report = on_report
+        self.interval = base_interval
+        self.peers: Dict[str, ConnectionQuality] = {}
+        self.streams: Dict[str, dict] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _poll(self, connection_id: str, connection: dict):
+        pc = connection["pc"]
+        quality = self.peers.get(connection_id)
+        if quality is None or quality.stream_id != connection.get("stream_id"):
+            quality = self.peers[connection_id] = ConnectionQuality(
+                connection_id, connection.get("role"), connection.get("stream_id")
+            )
+        try:
+            report = await pc.getStats()
+        except Exception as e:
+            logger.debug(f"getStats failed for {connection_id}: {e}")
+            return
+        quality.update(report, self.smoothing)
+
+    async def poll_once(self):
+        targets = [
+            (connection_id, connection)
+            for connection_id, connection in list(self.connections.items())
+            if connection.get("pc") is not None
+            and connection["pc"].connectionState == "connected"
+        ]
+        await asyncio.gather(*(self._poll(cid, conn) for cid, conn in targets))
+
+        polled = {connection_id for connection_id, _ in targets}
+        for connection_id in list(self.peers):
+            if connection_id not in polled:
+                del self.peers[connection_id]
+        self.streams = self._aggregate()
+        self.interval = min(
+            self.max_interval,
+            max(self.base_interval, len(targets) / self.polls_per_second),
+        )
+
+    def _aggregate(self) -> Dict[str, dict]:
+        streams: Dict[str, dict] = {}
+        for quality in self.peers.values():
+            if quality.stream_id is None or quality.updated is None:
+                continue
+            stream = streams.setdefault(
+                quality.stream_id,
+                {"stream_id": quality.stream_id, "uplink": None, "downlink": []},
+            )
+            if quality.role == "sender":
+                stream["uplink"] = quality.summary()
+            else:
+                stream["downlink"].append(quality.summary())
+        for stream in streams.values():
+            receivers: List[dict] = stream.pop("downlink")
+            rtts = [r["rtt_ms"] for r in receivers if r["rtt_ms"] is not None]
+            stream["downlink"] = {
+                "receivers": len(receivers),
+                "loss_avg": (
+                    round(sum(r["loss"] for r in receivers) / len(receivers), 4)
+                    if receivers
+                    else 0.0
+                ),
+                "loss_max": max((r["loss"] for r in receivers), default=0.0),
+                "jitter_ms_max": max((r["jitter_ms"] for r in receivers), default=0.0),
+                "rtt_ms_max": max(rtts, default=None),
+            }
+            stream["connections"] = receivers
+        return streams
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll_once()
+                if self.on_report and self.streams:
+                    self.on_report(self.streams)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Quality poll failed: {e}")
+            await asyncio.sleep(self.interval)
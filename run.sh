@@ -114,6 +114,20 @@ case "$SSL_MODE" in
         export SSL_KEY_FILE="$KEY_FILE"
         export LOG_LEVEL=$(jq -r '.log_level // "info"' /data/options.json)
         export AUDIO_PORT=$(jq -r '.audio_port // "8081"' /data/options.json)
+        export LISTENER_BACKPRESSURE=$(jq -r '.listener_backpressure // "drop_oldest"' /data/options.json)
+        export ENCODER_EXECUTOR=$(jq -r '.encoder_executor // "thread"' /data/options.json)
+        export WORKERS=$(jq -r '.workers // 1' /data/options.json)
+        export PREBUFFER_MS=$(jq -r '.prebuffer_ms // 1000' /data/options.json)
+        export PREWARM=$(jq -r '.prewarm // false' /data/options.json)
+        export ROOM_MIX=$(jq -r '.room_mix // false' /data/options.json)
+        export VAD_GATE=$(jq -r 'if .vad_gate == false then "false" else "true" end' /data/options.json)
+        export MAX_STREAM_PROFILES=$(jq -r '.max_stream_profiles // 4' /data/options.json)
+        export RECORD=$(jq -r '.record // false' /data/options.json)
+        export RECORD_DIR=/config/voice_recordings
+        export RECORD_RETENTION_HOURS=$(jq -r '.record_retention_hours // 24' /data/options.json)
+        export RECORD_MAX_MB=$(jq -r '.record_max_mb // 1024' /data/options.json)
+        export REPLAY_SECONDS=$(jq -r '.replay_seconds // 0' /data/options.json)
+        export DRAIN_TIMEOUT=$(jq -r '.drain_timeout // 20' /data/options.json)
         
         exec python3 /app/webrtc_server_relay.py
         ;;
@@ -125,6 +139,20 @@ case "$SSL_MODE" in
         export PORT=8099
         export LOG_LEVEL=$(jq -r '.log_level // "info"' /data/options.json)
         export AUDIO_PORT=$(jq -r '.audio_port // "8081"' /data/options.json)
+        export LISTENER_BACKPRESSURE=$(jq -r '.listener_backpressure // "drop_oldest"' /data/options.json)
+        export ENCODER_EXECUTOR=$(jq -r '.encoder_executor // "thread"' /data/options.json)
+        export WORKERS=$(jq -r '.workers // 1' /data/options.json)
+        export PREBUFFER_MS=$(jq -r '.prebuffer_ms // 1000' /data/options.json)
+        export PREWARM=$(jq -r '.prewarm // false' /data/options.json)
+        export ROOM_MIX=$(jq -r '.room_mix // false' /data/options.json)
+        export VAD_GATE=$(jq -r 'if .vad_gate == false then "false" else "true" end' /data/options.json)
+        export MAX_STREAM_PROFILES=$(jq -r '.max_stream_profiles // 4' /data/options.json)
+        export RECORD=$(jq -r '.record // false' /data/options.json)
+        export RECORD_DIR=/config/voice_recordings
+        export RECORD_RETENTION_HOURS=$(jq -r '.record_retention_hours // 24' /data/options.json)
+        export RECORD_MAX_MB=$(jq -r '.record_max_mb // 1024' /data/options.json)
+        export REPLAY_SECONDS=$(jq -r '.replay_seconds // 0' /data/options.json)
+        export DRAIN_TIMEOUT=$(jq -r '.drain_timeout // 20' /data/options.json)
         # No SSL env vars
         
         exec python3 /app/webrtc_server_relay.py
@@ -0,0 +1,534 @@
+import asyncio
+import fractions
+import itertools
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from metrics import ENCODE_SECONDS, HOT_PATH_SECONDS, SILENT_PACKETS
+
+logger = logging.getLogger(__name__)
+
+
+BACKPRESSURE_POLICIES = ("drop_oldest", "skip_to_live", "disconnect")
+
+_listener_ids = itertools.count(1)
+
+
+class StreamListener:
+    """A single HTTP client attached to a shared encoder.
+
+    Packets are queued in a bounded buffer that the client's writer drains.
+    When the client falls behind, the backpressure policy decides what happens:
+
+    - ``drop_oldest``: discard the oldest queued packet to make room
+    - ``skip_to_live``: discard the whole backlog and resume at the live edge
+    - ``disconnect``: end the stream once the backlog is ``max_lag`` seconds old
+
+    ``internal`` listeners (recorder, HLS segmenter, replay buffer) live in the
+    server itself and are left out of HTTP listener counts and metrics.
+    """
+
+    def __init__(
+        self,
+        remote: str = None,
+        max_packets: int = 256,
+        policy: str = "drop_oldest",
+        max_lag: float = 5.0,
+        internal: bool = False,
+    ):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.id = next(_listener_ids)  # remote alone is not unique
+        self.remote = remote
+        self.internal = internal
+        self.max_packets = max_packets
+        self.policy = policy
+        self.max_lag = max_lag
+        self.packets: Deque[Tuple[float, Optional[bytes]]] = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.bytes_sent = 0
+        self.bytes_dropped = 0
+        self.packets_dropped = 0
+
+    @property
+    def lag(self) -> float:
+        """Age in seconds of the oldest queued packet"""
+        if not self.packets:
+            return 0.0
+        return time.monotonic() - self.packets[0][0]
+
+    def push(self, data: Optional[bytes]):
+        if self.closed:
+            return
+
+        now = time.monotonic()
+        if data is not None and self.packets:
+            full = len(self.packets) >= self.max_packets
+            if self.policy == "disconnect":
+                if full or now - self.packets[0][0] > self.max_lag:
+                    logger.warning(
+                        f"Disconnecting slow listener {self.remote} "
+                        f"({len(self.packets)} packets behind)"
+                    )
+                    self._drop(len(self.packets))
+                    self.bytes_dropped += len(data)
+                    self.packets_dropped += 1
+                    data = None
+            elif full:
+                self._drop(1 if self.policy == "drop_oldest" else len(self.packets))
+
+        if data is None:
+            self.closed = True
+        self.packets.append((now, data))
+        self.ready.set()
+
+    def _drop(self, count: int):
+        for _ in range(count):
+            _, dropped = self.packets.popleft()
+            if dropped is not None:
+                self.bytes_dropped += len(dropped)
+                self.packets_dropped += 1
+
+    async def get(self) -> Optional[bytes]:
+        while not self.packets:
+            self.ready.clear()
+            await self.ready.wait()
+        _, data = self.packets.popleft()
+        if data is not None:
+            self.bytes_sent += len(data)
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "id": self.id,
+            "remote": self.remote,
+            "policy": self.policy,
+            "queued_packets": len(self.packets),
+            "lag_seconds": round(self.lag, 3),
+            "bytes_sent": self.bytes_sent,
+            "bytes_dropped": self.bytes_dropped,
+            "packets_dropped": self.packets_dropped,
+        }
+
+
+# ADTS sampling_frequency_index values
+ADTS_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000)
+
+# Layer III bit rates (kbps) for each MPEG version, which the sample rate selects
+_MPEG1_KBPS = (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_MPEG2_KBPS = (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+MP3_BIT_RATES = {
+    (32000, 44100, 48000): _MPEG1_KBPS,
+    (16000, 22050, 24000): _MPEG2_KBPS,
+    (8000, 11025, 12000): _MPEG2_KBPS[:8],
+}
+
+
+class Mp3Codec:
+    """Resampler plus MP3 encoder for one output profile.
+
+    Instances are only ever used by one batch at a time, so they can run on
+    the event loop, in a worker thread, or inside a worker process.
+    """
+
+    codec_name = "mp3"
+    sample_format = "s16p"
+    fixed_frame_size = False
+    # Without the bit reservoir every packet decodes on its own, so packets can
+    # be dropped by backpressure or replaced by cached silence without glitches
+    options = {"reservoir": "0"}
+
+    def __init__(
+        self, bit_rate: int = 128000, sample_rate: int = 44100, channels: int = 2
+    ):
+        self.bit_rate = bit_rate
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.codec_context = None
+        self.resampler = None
+
+    @classmethod
+    def from_query(cls, query) -> "Mp3Codec":
+        """Build a profile from ``bitrate``/``rate``/``channels`` request
+        parameters, falling back to the defaults; raises ValueError"""
+        default = cls()
+        bit_rate = query.get("bitrate")
+        if bit_rate is None:
+            kbps = default.bit_rate // 1000
+        elif bit_rate.lower().endswith("k"):
+            kbps = int(bit_rate[:-1])
+        else:
+            kbps = int(bit_rate) // 1000
+        sample_rate = int(query.get("rate", default.sample_rate))
+        channels = int(query.get("channels", default.channels))
+
+        bit_rates = next(
+            (rates for group, rates in MP3_BIT_RATES.items() if sample_rate in group),
+            None,
+        )
+        if bit_rates is None:
+            raise ValueError(f"Unsupported MP3 sample rate: {sample_rate}")
+        if kbps not in bit_rates:
+            raise ValueError(f"Bit rates at {sample_rate} Hz: {bit_rates} (kbps)")
+        if channels not in (1, 2):
+            raise ValueError("channels must be 1 or 2")
+        return cls(kbps * 1000, sample_rate, channels)
+
+    @property
+    def config(self) -> dict:
+        return {
+            "bit_rate": self.bit_rate,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+        }
+
+    @property
+    def packet_samples(self) -> int:
+        # MPEG-2 and 2.5 layer III frames hold half as many samples
+        return 1152 if self.sample_rate >= 32000 else 576
+
+    @property
+    def layout(self) -> str:
+        return "stereo" if self.channels == 2 else "mono"
+
+    @property
+    def profile(self) -> str:
+        """Encoder key: the bare codec name for the default profile"""
+        if self.config == type(self)().config:
+            return self.codec_name
+        return (
+            f"{self.codec_name}-{self.bit_rate // 1000}k-"
+            f"{self.sample_rate}-{self.channels}ch"
+        )
+
+    def open(self):
+        import av  # deferred: PyAV and its codecs load on the first encode
+
+        codec_context = av.CodecContext.create(av.codec.Codec(self.codec_name, "w"))
+        codec_context.bit_rate = self.bit_rate
+        codec_context.sample_rate = self.sample_rate
+        codec_context.format = av.AudioFormat(self.sample_format)
+        codec_context.layout = self.layout
+        codec_context.time_base = fractions.Fraction(1, self.sample_rate)
+        codec_context.options = dict(self.options)
+        codec_context.open()
+        self.codec_context = codec_context
+
+        # Resampler to ensure compatible format for the encoder
+        self.resampler = av.AudioResampler(
+            format=self.sample_format,
+            layout=self.layout,
+            rate=self.sample_rate,
+            frame_size=codec_context.frame_size if self.fixed_frame_size else None,
+        )
+
+    def package(self, packet) -> bytes:
+        return bytes(packet)
+
+    def encode(self, frames: List) -> Tuple[List[bytes], float]:
+        """Encode a batch of frames, returning packets and the CPU time spent"""
+        started = time.perf_counter()
+        if self.codec_context is None:
+            self.open()
+        packets = []
+        for frame in frames:
+            for r_frame in self.resampler.resample(frame):
+                packets.extend(
+                    self.package(p) for p in self.codec_context.encode(r_frame)
+                )
+        return packets, time.perf_counter() - started
+
+    def silence_packet(self) -> bytes:
+        """One steady-state packet of digital silence for this profile"""
+        key = (type(self), self.bit_rate, self.sample_rate, self.channels)
+        packet = _SILENCE_PACKETS.get(key)
+        if packet is None:
+            import av
+            import numpy as np
+
+            codec = type(self)(**self.config)
+            zeros = np.zeros((1, 2 * self.packet_samples), dtype=np.int16)
+            packets = []
+            # Skip the first packets, which still carry encoder start-up state
+            while len(packets) < 4:
+                frame = av.AudioFrame.from_ndarray(zeros, format="s16", layout="stereo")
+                frame.sample_rate = self.sample_rate
+                packets.extend(codec.encode([frame])[0])
+            packet = _SILENCE_PACKETS[key] = packets[-1]
+        return packet
+
+
+_SILENCE_PACKETS: Dict[tuple, bytes] = {}
+
+
+class AacCodec(Mp3Codec):
+    """AAC-LC encoder producing self-delimiting ADTS frames (1024 samples each)"""
+
+    codec_name = "aac"
+    sample_format = "fltp"
+    fixed_frame_size = True
+    packet_samples = 1024
+    options = {}
+
+    def __init__(
+        self, bit_rate: int = 96000, sample_rate: int = 48000, channels: int = 2
+    ):
+        if sample_rate not in ADTS_SAMPLE_RATES:
+            raise ValueError(f"Unsupported AAC sample rate: {sample_rate}")
+        super().__init__(bit_rate, sample_rate, channels)
+
+    def package(self, packet) -> bytes:
+        payload = bytes(packet)
+        length = len(payload) + 7
+        rate_index = ADTS_SAMPLE_RATES.index(self.sample_rate)
+        channels = self.channels
+        header = bytes(
+            (
+                0xFF,
+                0xF1,  # MPEG-4, layer 0, no CRC
+                (1 << 6) | (rate_index << 2) | (channels >> 2),  # AAC LC
+                ((channels & 3) << 6) | (length >> 11),
+                (length >> 3) & 0xFF,
+                ((length & 7) << 5) | 0x1F,
+                0xFC,
+            )
+        )
+        return header + payload
+
+
+CODECS = {"mp3": Mp3Codec, "aac": AacCodec}
+
+
+class SharedEncoder:
+    """Encode one relayed track once and fan the packets out to every listener.
+
+    The encoder subscribes to the source track on the first listener and
+    stops (releasing its relay subscription) when the last listener leaves,
+    unless ``keep_alive`` is set. Frames are handed to the encoder pool in
+    batches; only one batch is in flight at a time, so packets always come
+    back in order. While a batch is encoding, newly received frames
+    accumulate into the next one.
+
+    The most recent ``prebuffer_seconds`` of packets (at most
+    ``prebuffer_bytes``) are kept in a ring and sent to new listeners as a
+    burst, so players can start without waiting for fresh audio.
+
+    With a voice activity ``gate``, frames that arrive while the gate is closed
+    are not encoded at all: listeners get a cached silence packet for every
+    ``packet_samples`` of input instead, keeping the stream's timing intact.
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        relay,
+        source_track,
+        pool,
+        output_format: str = "mp3",
+        on_idle: Callable[["SharedEncoder"], None] = None,
+        max_batch: int = 50,
+        codec: Mp3Codec = None,
+        prebuffer_seconds: float = 0.0,
+        prebuffer_bytes: int = 256 * 1024,
+        keep_alive: bool = False,
+        gate=None,
+    ):
+        self.stream_id = stream_id
+        self.relay = relay
+        self.source_track = source_track
+        self.pool = pool
+        self.output_format = output_format
+        self.on_idle = on_idle
+        self.max_batch = max_batch
+        self.codec = codec or CODECS[output_format]()
+        self.keep_alive = keep_alive
+        self.gate = gate
+        self.silent_samples = 0.0
+        packets = prebuffer_seconds * self.codec.sample_rate / self.codec.packet_samples
+        self.prebuffer: Deque[bytes] = deque(maxlen=max(0, round(packets)))
+        self.prebuffer_bytes = prebuffer_bytes
+        self.prebuffered = 0
+        self.codec_key = uuid.uuid4().hex
+        self.listeners: Set[StreamListener] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.track = None
+        self.finished = False
+        self.batch: List = []
+        self.inflight: Optional[asyncio.Future] = None
+        self.frames_dropped = 0
+
+    @property
+    def key(self):
+        return (self.stream_id, self.codec.profile)
+
+    @property
+    def clients(self) -> List[StreamListener]:
+        """Listeners that are HTTP responses rather than internal consumers"""
+        return [listener for listener in self.listeners if not listener.internal]
+
+    def start(self):
+        if self.task is None and not self.finished:
+            self.track = self.relay.subscribe(self.source_track)
+            self.task = asyncio.create_task(self._run())
+            logger.info(
+                f"Started shared {self.codec.profile} encoder for {self.stream_id}"
+            )
+
+    def add_listener(self, remote: str = None, **options) -> StreamListener:
+        listener = StreamListener(remote, **options)
+        self.listeners.add(listener)
+        if self.finished:
+            listener.push(None)
+            return listener
+        # Late joiners start with the recent past instead of silence. Seed at
+        # most half the listener's queue: a longer burst would trip its
+        # backpressure policy (or disconnect it) before it read anything
+        seed = min(len(self.prebuffer), listener.max_packets // 2)
+        for packet in itertools.islice(
+            self.prebuffer, len(self.prebuffer) - seed, None
+        ):
+            listener.push(packet)
+        self.start()
+        return listener
+
+    def remove_listener(self, listener: StreamListener):
+        self.listeners.discard(listener)
+        if not self.listeners and (not self.keep_alive or self.finished):
+            self.stop()
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.track is not None:
+            self.track.stop()
+            self.track = None
+            self.batch.clear()
+            self.prebuffer.clear()
+            self.prebuffered = 0
+            self.pool.release(self.codec_key)
+            logger.info(
+                f"Stopped shared {self.codec.profile} encoder for {self.stream_id}"
+            )
+            ENCODE_SECONDS.remove(self.stream_id, self.codec.profile)
+        if self.on_idle:
+            self.on_idle(self)
+
+    def _broadcast(self, data: Optional[bytes]):
+        for listener in list(self.listeners):
+            listener.push(data)
+
+    def _remember(self, packet: bytes):
+        if self.prebuffer.maxlen == 0:
+            return
+        if len(self.prebuffer) == self.prebuffer.maxlen:
+            self.prebuffered -= len(self.prebuffer[0])
+        self.prebuffer.append(packet)
+        self.prebuffered += len(packet)
+        while self.prebuffered > self.prebuffer_bytes and self.prebuffer:
+            self.prebuffered -= len(self.prebuffer.popleft())
+
+    def _emit_silence(self, frame):
+        codec = self.codec
+        self.silent_samples += frame.samples * codec.sample_rate / frame.sample_rate
+        if self.silent_samples < codec.packet_samples:
+            return
+        packet = codec.silence_packet()
+        while self.silent_samples >= codec.packet_samples:
+            self.silent_samples -= codec.packet_samples
+            self._remember(packet)
+            self._broadcast(packet)
+            self._silent_packets.inc()
+
+    def _submit(self):
+        if self.inflight is not None or not self.batch:
+            return
+        frames, self.batch = self.batch, []
+        try:
+            self.inflight = self.pool.encode(self.codec_key, self.codec, frames)
+        except Exception as e:
+            logger.error(f"Could not submit frames for {self.stream_id}: {e}")
+            return
+        self.inflight.add_done_callback(
+            lambda future, count=len(frames): self._on_batch_done(future, count)
+        )
+
+    def _on_batch_done(self, future: asyncio.Future, frame_count: int):
+        self.inflight = None
+        if future.cancelled() or self.track is None:
+            return
+        try:
+            packets, elapsed = future.result()
+        except Exception as e:
+            logger.error(f"Encoder error for {self.stream_id}: {e}")
+        else:
+            self._encode_seconds.observe(elapsed / frame_count)
+            for packet in packets:
+                self._remember(packet)
+                self._broadcast(packet)
+        self._submit()
+
+    async def _run(self):
+        track = self.track
+        self._encode_seconds = ENCODE_SECONDS.labels(self.stream_id, self.codec.profile)
+        hot_path_seconds = HOT_PATH_SECONDS.labels(f"{self.output_format}_encode")
+        self._silent_packets = SILENT_PACKETS.labels(self.output_format)
+        gate = self.gate
+        try:
+            while True:
+                try:
+                    frame = await track.recv()
+                except Exception as e:
+                    # End of stream or error
+                    logger.info(f"Stream {self.stream_id} ended or error: {e}")
+                    break
+
+                # Only switch to silence once queued speech has been encoded,
+                # so packets never go out of order
+                if (
+                    gate is not None
+                    and not gate.active
+                    and self.inflight is None
+                    and not self.batch
+                ):
+                    self._emit_silence(frame)
+                    continue
+                self.silent_samples = 0.0
+
+                if len(self.batch) >= self.max_batch:
+                    # The pool cannot keep up; shed the oldest audio
+                    self.batch.pop(0)
+                    self.frames_dropped += 1
+                    if self.frames_dropped % 500 == 1:
+                        logger.warning(
+                            f"Encoder for {self.stream_id} is behind, "
+                            f"{self.frames_dropped} frames dropped"
+                        )
+                self.batch.append(frame)
+
+                started = time.perf_counter()
+                self._submit()
+                hot_path_seconds.observe(time.perf_counter() - started)
+
+            # Flush what is left before ending the stream
+            while self.inflight is not None or self.batch:
+                self._submit()
+                await asyncio.wait([self.inflight])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Encoder error for {self.stream_id}: {e}")
+
+        # Tell every listener the stream is over
+        self.finished = True
+        self.prebuffer.clear()
+        self.prebuffered = 0
+        self._broadcast(None)
+        if not self.listeners:
+            # Kept alive without listeners; nobody else will release it
+            self.task = None
+            self.stop()
@@ -0,0 +1,176 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StreamRecord:
+    """State for one published stream"""
+
+    __slots__ = (
+        "stream_id",
+        "track",
+        "sender_id",
+        "passthrough",
+        "remote",
+        "mixed",
+        "vad",
+        "receivers",
+        "created_at",
+        "last_activity",
+    )
+
+    def __init__(
+        self,
+        stream_id: str,
+        track,
+        sender_id: Optional[str] = None,
+        passthrough=None,
+        remote: bool = False,
+        mixed: bool = False,
+        vad=None,
+    ):
+        self.stream_id = stream_id
+        self.track = track
+        self.sender_id = sender_id
+        self.passthrough = passthrough
+        self.remote = remote  # relayed from another worker (cluster mode)
+        self.mixed = mixed  # server-side room mix rather than a sender
+        self.vad = vad  # VoiceActivityGate fed by process_visualization
+        self.receivers: Set[str] = set()
+        self.created_at = self.last_activity = time.monotonic()
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+
+class StreamRegistry:
+    """Streams by id in publication order, with receiver index and idle expiry.
+
+    Expiry uses a heap holding one deadline per stream. Activity only updates
+    ``last_activity``; when a deadline comes up the entry is re-armed from the
+    latest activity instead of expiring, so touching a stream costs nothing.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = 600.0,
+        on_expire: Callable[[StreamRecord], None] = None,
+    ):
+        self.idle_timeout = idle_timeout
+        self.on_expire = on_expire
+        self._streams: Dict[str, StreamRecord] = {}
+        self._receivers: Dict[str, str] = {}  # connection_id -> stream_id
+        self._heap: List[Tuple[float, int, StreamRecord]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def __contains__(self, stream_id: str) -> bool:
+        return stream_id in self._streams
+
+    def __iter__(self) -> Iterator[StreamRecord]:
+        return iter(list(self._streams.values()))
+
+    def get(self, stream_id: str) -> Optional[StreamRecord]:
+        return self._streams.get(stream_id)
+
+    def ids(self) -> List[str]:
+        return list(self._streams)
+
+    @property
+    def latest(self) -> Optional[StreamRecord]:
+        """Most recently published sender stream (room mixes are never latest)"""
+        for record in reversed(self._streams.values()):
+            if not record.mixed:
+                return record
+        return None
+
+    def add(self, record: StreamRecord) -> StreamRecord:
+        self.remove(record.stream_id)
+        self._streams[record.stream_id] = record
+        self._push(record, record.last_activity + self.idle_timeout)
+        return record
+
+    def remove(
+        self, stream_id: str, record: StreamRecord = None
+    ) -> Optional[StreamRecord]:
+        """Drop a stream; with ``record`` only if it is still the current one"""
+        current = self._streams.get(stream_id)
+        if current is None or (record is not None and current is not record):
+            return None
+        del self._streams[stream_id]
+        for connection_id in current.receivers:
+            self._receivers.pop(connection_id, None)
+        current.receivers.clear()
+        return current
+
+    def add_receiver(self, stream_id: str, connection_id: str):
+        record = self._streams.get(stream_id)
+        if record is None:
+            return
+        previous = self._receivers.get(connection_id)
+        if previous is not None and previous != stream_id:
+            self.remove_receiver(connection_id)
+        record.receivers.add(connection_id)
+        record.touch()
+        self._receivers[connection_id] = stream_id
+
+    def remove_receiver(self, connection_id: str) -> Optional[str]:
+        stream_id = self._receivers.pop(connection_id, None)
+        record = self._streams.get(stream_id) if stream_id else None
+        if record is not None:
+            record.receivers.discard(connection_id)
+            record.touch()
+        return stream_id
+
+    def stream_of(self, connection_id: str) -> Optional[str]:
+        return self._receivers.get(connection_id)
+
+    def _push(self, record: StreamRecord, deadline: float):
+        heapq.heappush(self._heap, (deadline, next(self._seq), record))
+        if self._heap[0][2] is record:
+            self._arm()
+
+    def _arm(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._heap:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop yet; armed again on the next add
+        delay = max(0.0, self._heap[0][0] - time.monotonic())
+        self._timer = loop.call_later(delay, self._expire_due)
+
+    def _expire_due(self):
+        self._timer = None
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, record = heapq.heappop(self._heap)
+            if self._streams.get(record.stream_id) is not record:
+                continue  # Already removed or replaced
+            deadline = record.last_activity + self.idle_timeout
+            if record.remote or record.mixed:
+                # Remote feeds are removed when the owning worker closes them,
+                # room mixes when their last input leaves
+                deadline = now + self.idle_timeout
+            if deadline > now:
+                heapq.heappush(self._heap, (deadline, next(self._seq), record))
+                continue
+            logger.info(
+                f"Stream {record.stream_id} idle for {self.idle_timeout:.0f}s, expiring"
+            )
+            if self.on_expire:
+                self.on_expire(record)
+            else:
+                self.remove(record.stream_id, record)
+        self._arm()
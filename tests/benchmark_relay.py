@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""Offline load benchmark for the relay.
+
+Starts VoiceStreamingServer in this process on loopback and drives it from a
+separate load-generator process, so CPU and memory figures cover the server
+only. Each synthetic sender emits a short 1 kHz pulse every second; receivers
+and MP3 listeners detect the pulse onset to measure end-to-end latency.
+
+    python tests/benchmark_relay.py --senders 2 --receivers 3 --listeners 5
+    python tests/benchmark_relay.py --output run.json --baseline previous.json
+"""
+
+import argparse
+import asyncio
+import fractions
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import av  # noqa: E402
+import numpy as np  # noqa: E402
+from aiohttp import ClientSession, web  # noqa: E402
+from aiortc import (  # noqa: E402
+    MediaStreamTrack,
+    RTCConfiguration,
+    RTCPeerConnection,
+    RTCSessionDescription,
+)
+from aiortc.contrib.media import MediaPlayer  # noqa: E402
+from aiortc.mediastreams import MediaStreamError  # noqa: E402
+
+from audio_meter import frame_to_mono  # noqa: E402
+
+SAMPLE_RATE = 48000
+FRAME_SAMPLES = 960
+PULSE_INTERVAL = 1.0
+PULSE_SECONDS = 0.1
+ONSET_RMS = 0.05
+
+# Lower is better for all of these; used by --baseline
+REGRESSION_KEYS = (
+    ("server", "cpu_percent_per_stream"),
+    ("server", "rss_growth_mb"),
+    ("receivers", "first_audio_ms", "p95"),
+    ("receivers", "latency_ms", "p95"),
+    ("listeners", "first_audio_ms", "p95"),
+    ("listeners", "latency_ms", "p95"),
+)
+
+
+class PulseTrack(MediaStreamTrack):
+    """Real-time mono track: silence with a 1 kHz pulse every PULSE_INTERVAL"""
+
+    kind = "audio"
+
+    def __init__(self, pulse_times: list):
+        super().__init__()
+        self.pulse_times = pulse_times
+        self.pts = 0
+        self.started = None
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+        if self.started is None:
+            self.started = time.time()
+        delay = self.started + self.pts / SAMPLE_RATE - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        position = (self.pts / SAMPLE_RATE) % PULSE_INTERVAL
+        if position < PULSE_SECONDS:
+            if position == 0:
+                self.pulse_times.append(time.time())
+            t = (np.arange(FRAME_SAMPLES) + self.pts) / SAMPLE_RATE
+            samples = (np.sin(2 * np.pi * 1000 * t) * 0.5 * 32767).astype(np.int16)
+        else:
+            samples = np.zeros(FRAME_SAMPLES, dtype=np.int16)
+
+        frame = av.AudioFrame.from_ndarray(
+            samples.reshape(1, -1), format="s16", layout="mono"
+        )
+        frame.sample_rate = SAMPLE_RATE
+        frame.pts = self.pts
+        frame.time_base = fractions.Fraction(1, SAMPLE_RATE)
+        self.pts += FRAME_SAMPLES
+        return frame
+
+
+class OnsetDetector:
+    """Match pulse onsets in decoded audio against the sender's pulse times"""
+
+    def __init__(self, pulse_times: list, started: float):
+        self.pulse_times = pulse_times
+        self.started = started
+        self.first_audio = None
+        self.latencies = []
+        self.active = False
+
+    def feed(self, frame, now: float):
+        if self.first_audio is None:
+            self.first_audio = now - self.started
+        mono = frame_to_mono(frame)
+        loud = mono.size > 0 and float(np.sqrt(np.mean(np.square(mono)))) > ONSET_RMS
+        if loud and not self.active:
+            sent = [t for t in self.pulse_times if t <= now]
+            if sent and now - sent[-1] < PULSE_INTERVAL:
+                self.latencies.append(now - sent[-1])
+        self.active = loud
+
+
+def summarize(values: list, scale: float = 1000.0):
+    if not values:
+        return None
+    data = np.asarray(values) * scale
+    return {
+        "count": int(data.size),
+        "mean": round(float(data.mean()), 2),
+        "p50": round(float(np.percentile(data, 50)), 2),
+        "p95": round(float(np.percentile(data, 95)), 2),
+        "max": round(float(data.max()), 2),
+    }
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ── Load generator (runs in a child process) ──
+
+
+async def start_sender(session, ws_url, source, pulse_times):
+    ws = await session.ws_connect(ws_url)
+    pc = RTCPeerConnection(RTCConfiguration(iceServers=[]))
+    if source == "tone":
+        pc.addTrack(PulseTrack(pulse_times))
+    else:
+        player = MediaPlayer(source, loop=True)
+        pc.addTrack(player.audio)
+
+    stream_id, available = None, False
+    await ws.send_json({"type": "start_sending"})
+    async for msg in ws:
+        data = json.loads(msg.data)
+        if data["type"] == "sender_ready":
+            stream_id = f"stream_{data['connection_id']}"
+            await pc.setLocalDescription(await pc.createOffer())
+            await ws.send_json(
+                {
+                    "type": "webrtc_offer",
+                    "offer": {"sdp": pc.localDescription.sdp, "type": "offer"},
+                }
+            )
+        elif data["type"] == "webrtc_answer":
+            await pc.setRemoteDescription(RTCSessionDescription(**data["answer"]))
+        elif data["type"] == "stream_available" and data["stream_id"] == stream_id:
+            available = True
+        if available and pc.remoteDescription is not None:
+            break
+    return stream_id, ws, pc
+
+
+async def run_receiver(session, ws_url, stream_id, detector):
+    ws = await session.ws_connect(ws_url)
+    pc = RTCPeerConnection(RTCConfiguration(iceServers=[]))
+    tracks = asyncio.Queue()
+    pc.on("track", tracks.put_nowait)
+    try:
+        await ws.send_json({"type": "start_receiving", "stream_id": stream_id})
+        async for msg in ws:
+            data = json.loads(msg.data)
+            if data["type"] == "webrtc_offer":
+                await pc.setRemoteDescription(RTCSessionDescription(**data["offer"]))
+                await pc.setLocalDescription(await pc.createAnswer())
+                await ws.send_json(
+                    {
+                        "type": "webrtc_answer",
+                        "answer": {"sdp": pc.localDescription.sdp, "type": "answer"},
+                    }
+                )
+                break
+            if data["type"] == "error":
+                raise RuntimeError(data["message"])
+
+        track = await tracks.get()
+        while True:
+            frame = await track.recv()
+            detector.feed(frame, time.time())
+    except MediaStreamError:
+        pass
+    finally:
+        await pc.close()
+        await ws.close()
+
+
+async def run_listener(session, url, detector):
+    codec = av.CodecContext.create("mp3", "r")
+    async with session.get(url) as response:
+        async for chunk in response.content.iter_any():
+            now = time.time()
+            for packet in codec.parse(chunk):
+                for frame in codec.decode(packet):
+                    detector.feed(frame, now)
+
+
+async def generate_load(base_url: str, config: dict, conn):
+    ws_url = base_url.replace("http", "ws", 1) + "/ws"
+    async with ClientSession() as session:
+        senders = []
+        for _ in range(config["senders"]):
+            pulse_times = []
+            stream_id, ws, pc = await start_sender(
+                session, ws_url, config["source"], pulse_times
+            )
+            senders.append((stream_id, ws, pc, pulse_times))
+
+        receivers, listeners, tasks = [], [], []
+        for stream_id, _, _, pulse_times in senders:
+            for _ in range(config["receivers"]):
+                detector = OnsetDetector(pulse_times, time.time())
+                receivers.append(detector)
+                tasks.append(
+                    asyncio.create_task(
+                        run_receiver(session, ws_url, stream_id, detector)
+                    )
+                )
+            for _ in range(config["listeners"]):
+                detector = OnsetDetector(pulse_times, time.time())
+                listeners.append(detector)
+                url = f"{base_url}/stream/{stream_id}.mp3"
+                tasks.append(asyncio.create_task(run_listener(session, url, detector)))
+
+        await asyncio.sleep(config["warmup"])
+        # Latency before the measurement window includes connection setup
+        for detector in receivers + listeners:
+            detector.latencies.clear()
+        conn.send({"event": "measuring"})
+        await asyncio.sleep(config["duration"])
+        conn.send({"event": "measured"})
+
+        # Clients run until cancelled; anything that finished early failed
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [repr(r) for r in results if isinstance(r, Exception)]
+        for _, ws, pc, _ in senders:
+            await pc.close()
+            await ws.close()
+
+    def report(detectors):
+        return {
+            "clients": len(detectors),
+            "connected": sum(d.first_audio is not None for d in detectors),
+            "first_audio_ms": summarize(
+                [d.first_audio for d in detectors if d.first_audio is not None]
+            ),
+            "latency_ms": summarize([x for d in detectors for x in d.latencies]),
+        }
+
+    conn.send(
+        {
+            "event": "done",
+            "receivers": report(receivers),
+            "listeners": report(listeners),
+            "errors": errors,
+        }
+    )
+
+
+def load_main(base_url: str, config: dict, conn):
+    try:
+        asyncio.run(generate_load(base_url, config, conn))
+    except Exception as e:
+        conn.send({"event": "failed", "error": repr(e)})
+
+
+# ── Server side ──
+
+
+async def benchmark(config: dict) -> dict:
+    from webrtc_server_relay import VoiceStreamingServer
+
+    server = VoiceStreamingServer()
+    server.load_media()
+    server.setup_stream_routes()
+    server.loop_monitor.start()
+    runner = web.AppRunner(server.app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    process = context.Process(
+        target=load_main, args=(f"http://127.0.0.1:{port}", config, child)
+    )
+    process.start()
+
+    loop = asyncio.get_event_loop()
+    deadline = config["warmup"] + config["duration"] + 60
+
+    async def next_message():
+        ready = await loop.run_in_executor(None, parent.poll, deadline)
+        if not ready:
+            raise TimeoutError("Load generator stopped responding")
+        message = parent.recv()
+        if message["event"] == "failed":
+            raise RuntimeError(f"Load generator failed: {message['error']}")
+        return message
+
+    try:
+        await next_message()  # measuring
+        cpu_start, wall_start, rss_start = time.process_time(), time.time(), rss_mb()
+        streams_start = len(server.active_streams)
+        await next_message()  # measured
+        cpu = time.process_time() - cpu_start
+        wall = time.time() - wall_start
+        rss_end = rss_mb()
+        client = await next_message()  # done
+    finally:
+        await loop.run_in_executor(None, process.join, 10)
+        if process.is_alive():
+            process.terminate()
+        await server.audio_server.stop()
+        await runner.cleanup()
+
+    cpu_percent = cpu / wall * 100
+    return {
+        "config": config,
+        "python": sys.version.split()[0],
+        "av": av.__version__,
+        "server": {
+            "streams": streams_start,
+            "cpu_percent": round(cpu_percent, 2),
+            "cpu_percent_per_stream": round(cpu_percent / max(streams_start, 1), 2),
+            "rss_start_mb": round(rss_start, 1),
+            "rss_end_mb": round(rss_end, 1),
+            "rss_growth_mb": round(rss_end - rss_start, 2),
+            "event_loop": server.loop_monitor.stats(),
+        },
+        "receivers": client["receivers"],
+        "listeners": client["listeners"],
+        "errors": client["errors"],
+    }
+
+
+def lookup(results: dict, path: tuple):
+    for key in path:
+        if not isinstance(results, dict):
+            return None
+        results = results.get(key)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for path in REGRESSION_KEYS:
+        current, previous = lookup(results, path), lookup(baseline, path)
+        if current is None or previous is None or previous <= 0:
+            continue
+        if current > previous * (1 + tolerance):
+            regressions.append(
+                {"metric": ".".join(path), "baseline": previous, "current": current}
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--senders", type=int, default=1)
+    parser.add_argument("--receivers", type=int, default=2, help="per stream")
+    parser.add_argument("--listeners", type=int, default=2, help="per stream")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument(
+        "--source", default="tone", help="'tone' or a media file to loop"
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="previous JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    config = {
+        "senders": args.senders,
+        "receivers": args.receivers,
+        "listeners": args.listeners,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "source": args.source,
+    }
+    results = asyncio.run(benchmark(config))
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+        status = 1 if results["regressions"] else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,440 @@
 import asyncio
+import importlib
 import json
 import logging
 import os
+import random
+import signal
 import ssl
+import threading
+import time
 import uuid
-from typing import Dict
+from typing import TYPE_CHECKING, Dict
 
-from aiohttp import WSMsgType, web
-from aiortc import RTCConfiguration, RTCPeerConnection, RTCSessionDescription
-from aiortc.contrib.media import MediaRelay
+from aiohttp import WSCloseCode, WSMsgType, web
 
 from audio_stream_server import AudioStreamServer
+from broadcaster import Broadcaster
+from diagnostics import LoopLagMonitor, SamplingProfiler
+from handoff import HandoffServer, bind_socket, handoff_path, take_over
+from metrics import (
+    BYTES_RELAYED,
+    FIRST_AUDIO_SECONDS,
+    FRAMES_RECEIVED,
+    HOT_PATH_SECONDS,
+    MESSAGE_SECONDS,
+    OFFER_ANSWER_SECONDS,
+    REGISTRY,
+    CallbackMetric,
+    MetricsRegistry,
+)
+from rtc_stats import QualityMonitor
+from stream_registry import StreamRecord, StreamRegistry
+
+if TYPE_CHECKING:
+    from aiortc import RTCPeerConnection
 
 logger = logging.getLogger(__name__)
 
+# Modules that pull in aiortc, PyAV and NumPy. They are imported in a worker
+# thread once the listening sockets are up, not before.
+MEDIA_MODULES = (
+    "aiortc",
+    "aiortc.contrib.media",
+    "audio_meter",
+    "cluster_feed",
+    "opus_passthrough",
+    "peer_pool",
+    "relay_latency",
+    "room_mixer",
+)
+
+# Callers allowed to use /debug/profile and /admin/drain
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
+# Message types timed individually in handle_message; anything else is "other"
+MESSAGE_TYPES = (
+    "start_sending",
+    "start_receiving",
+    "webrtc_offer",
+    "webrtc_answer",
+    "get_available_streams",
+    "subscribe_levels",
+    "unsubscribe_levels",
+    "stop_stream",
+    "set_room_gain",
+    "subscribe_quality",
+    "unsubscribe_quality",
+)
+
 
 class VoiceStreamingServer:
     def __init__(self):
         self.connections: Dict[str, dict] = {}
-        self.active_streams: Dict[str, Dict] = {}  # stream_id -> {track, receivers[]}
-        self.total_audio_bytes = 0
+        self.active_streams = StreamRegistry(
+            idle_timeout=float(os.environ.get("STREAM_IDLE_TIMEOUT", 600)),
+            on_expire=self.expire_stream,
+        )
+        self.ice_gather_timeout = float(os.environ.get("ICE_GATHER_TIMEOUT", 2.0))
+        self.levels_rate_hz = float(os.environ.get("LEVELS_RATE_HZ", 15.0))
+        self.vad_gate = os.environ.get("VAD_GATE", "true").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        self.vad_threshold_db = float(os.environ.get("VAD_THRESHOLD_DB", -45.0))
+        self.vad_hangover = float(os.environ.get("VAD_HANGOVER_MS", 800)) / 1000
+        self.opus_passthrough = os.environ.get("OPUS_PASSTHROUGH", "true").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        # Server-side mix of every sender, published as one more stream
+        self.room_stream_id = (
+            os.environ.get("ROOM_STREAM_ID", "room")
+            if os.environ.get("ROOM_MIX", "false").lower() in ("1", "true", "yes")
+            else None
+        )
+        self.room_max_delay = float(os.environ.get("ROOM_MAX_DELAY_MS", 200)) / 1000
+        # Default receiver latency policy; clients may pick one in start_receiving
+        self.receiver_latency = os.environ.get("RECEIVER_LATENCY", "reliable")
+        self.live_max_delay = float(os.environ.get("LIVE_MAX_DELAY_MS", 100)) / 1000
+        self.room = None
+        self.broadcaster = Broadcaster(
+            self.connections,
+            send_timeout=float(os.environ.get("WS_SEND_TIMEOUT", 2.0)),
+            coalesce_delay=float(os.environ.get("BROADCAST_COALESCE_MS", 50)) / 1000,
+        )
         self.app = web.Application()
-        self.relay = MediaRelay()
+        self.relay = None  # set by load_media()
+        self.certificates = None
+        self.peer_pool = None
+        self.media_ready = asyncio.Event()
+        self.ready = False
+        self.startup_seconds = {}
+        # Drain mode: no new sessions, current ones run until DRAIN_TIMEOUT
+        self.draining = False
+        self.drain_timeout = float(os.environ.get("DRAIN_TIMEOUT", 20.0))
+        self.drain_spread = float(os.environ.get("DRAIN_RECONNECT_SPREAD", 10.0))
+        self.stopped = asyncio.Event()
+        self.site = None
+        self.signaling_socket = None
+        self.handoff = None
+        self.server_state = None  # (active_port, ssl) while we own the state file
         self.audio_server = AudioStreamServer(self)
+        self.loop_monitor = LoopLagMonitor()
+        self.quality = QualityMonitor(
+            self.connections,
+            base_interval=float(os.environ.get("RTC_STATS_INTERVAL", 2.0)),
+            max_interval=float(os.environ.get("RTC_STATS_MAX_INTERVAL", 30.0)),
+            on_report=self.publish_quality,
+        )
+        self.profiler = None
+        self.profile_lock = asyncio.Lock()
+        self.cluster = None  # ClusterWorker when running as one of several workers
         self.setup_routes()
+        self.setup_metrics()
+
+    def load_media(self):
+        """Create the WebRTC side of the server, importing aiortc if needed"""
+        if self.relay is not None:
+            return
+        from aiortc import RTCConfiguration
+        from aiortc.contrib.media import MediaRelay
+
+        from peer_pool import CertificateStore, PeerConnectionPool
+
+        self.relay = MediaRelay()
+        # One DTLS certificate for every connection, plus a few warm connections
+        self.certificates = CertificateStore(
+            rotate_interval=float(os.environ.get("DTLS_CERT_ROTATE_HOURS", 24)) * 3600
+        )
+        self.certificates.install()
+        self.peer_pool = PeerConnectionPool(
+            self.certificates,
+            size=int(os.environ.get("PEER_POOL_SIZE", 4)),
+            configuration=RTCConfiguration(iceServers=[]),
+        )
+        self.media_ready.set()
 
     def setup_routes(self):
         self.app.router.add_get("/health", self.health_check)
+        self.app.router.add_get("/ready", self.ready_check)
         self.app.router.add_get("/metrics", self.metrics_handler)
+        self.app.router.add_get("/debug/loop", self.debug_loop_handler)
+        self.app.router.add_get("/debug/profile", self.debug_profile_handler)
+        self.app.router.add_post("/admin/drain", self.drain_handler)
         self.app.router.add_get("/ws", self.websocket_handler)
         self.app.router.add_get("/", self.websocket_handler)
         self.start_time = asyncio.get_event_loop().time()
-        self.cleanup_task = None
 
-    async def metrics_handler(self, request):
-        """Provide Prometheus-compatible or JSON metrics"""
-        uptime = int(asyncio.get_event_loop().time() - self.start_time)
-        return web.json_response(
+    def setup_metrics(self):
+        """Register gauges that are computed from live state at scrape time.
+
+        They read this server's state, so they go in a registry of its own;
+        process-wide counters and histograms stay in ``REGISTRY``.
+        """
+        self.metrics = MetricsRegistry()
+        loop = asyncio.get_event_loop()
+        self.metrics.register(
+            CallbackMetric(
+                "voice_uptime_seconds",
+                "Seconds since the server started",
+                lambda: [({}, int(loop.time() - self.start_time))],
+            )
+        )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_connections",
+                "Open /ws connections by role",
+                self._connection_samples,
+            )
+        )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_streams",
+                "Active sender streams",
+                lambda: [({}, len(self.active_streams))],
+            )
+        )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_stream_receivers",
+                "WebRTC receivers per stream",
+                lambda: [
+                    ({"stream": record.stream_id}, len(record.receivers))
+                    for record in self.active_streams
+                ],
+            )
+        )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_stream_speaking",
+                "1 while the stream's voice activity gate is open",
+                lambda: [
+                    ({"stream": record.stream_id}, int(record.vad.active))
+                    for record in self.active_streams
+                    if record.vad is not None
+                ],
+            )
+        )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_stream_listeners",
+                "HTTP listeners per stream and output format",
+                lambda: [
+                    ({"stream": stream_id, "format": fmt}, len(encoder.clients))
+                    for (stream_id, fmt), encoder in list(
+                        self.audio_server.encoders.items()
+                    )
+                ],
+            )
+        )
+        for name, documentation, uplink, downlink in (
+            ("loss_ratio", "Smoothed RTP packet loss", "loss", "loss_max"),
+            ("jitter_ms", "Smoothed RTP jitter", "jitter_ms", "jitter_ms_max"),
+            ("rtt_ms", "Round-trip time from RTCP reports", None, "rtt_ms_max"),
+        ):
+            self.metrics.register(
+                CallbackMetric(
+                    f"voice_rtc_{name}",
+                    f"{documentation}; uplink is the sender, downlink the worst receiver",
+                    self._quality_samples(uplink, downlink),
+                )
+            )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_rtc_stats_interval_seconds",
+                "Current getStats polling interval",
+                lambda: [({}, self.quality.interval)],
+            )
+        )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_stream_listener_bytes_written_total",
+                "Encoded bytes written to each HTTP listener",
+                self._listener_samples("bytes_sent"),
+                metric_type="counter",
+            )
+        )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_stream_listener_bytes_dropped_total",
+                "Encoded bytes dropped for slow HTTP listeners",
+                self._listener_samples("bytes_dropped"),
+                metric_type="counter",
+            )
+        )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_replay_bytes",
+                "Encoded audio held in each stream's replay buffer",
+                lambda: [
+                    ({"stream": stream_id}, replay.bytes)
+                    for stream_id, replay in list(self.audio_server.replays.items())
+                ],
+            )
+        )
+        self.metrics.register(
+            CallbackMetric(
+                "voice_receiver_lag_seconds",
+                "Audio queued behind each WebRTC receiver's relay subscription",
+                lambda: [
+                    (
+                        {
+                            "stream": lag["stream_id"],
+                            "connection": lag["connection_id"],
+                            "policy": lag["policy"],
+                        },
+                        lag["lag_ms"] / 1000,
+                    )
+                    for lag in self.receiver_lag()
+                ],
+            )
+        )
+
+    def receiver_lag(self):
+        """Backlog of each WebRTC receiver's relay subscription"""
+        return [
             {
-                "uptime_seconds": uptime,
-                "active_connections": len(self.connections),
-                "active_streams": len(self.active_streams),
-                "total_audio_bytes": self.total_audio_bytes,
-                "webrtc_available": True,
+                "connection_id": connection_id,
+                "stream_id": connection.get("stream_id"),
+                "policy": connection["latency"],
+                "lag_ms": round(connection["track"].lag * 1000, 1),
+                "max_lag_ms": round(connection["track"].max_lag * 1000, 1),
+                "dropped": connection["track"].dropped,
             }
+            for connection_id, connection in list(self.connections.items())
+            if connection.get("track") is not None
+        ]
+
+    def _quality_samples(self, uplink_field: str, downlink_field: str):
+        """Per-stream link quality gauges from the latest getStats round"""
+
+        def samples():
+            result = []
+            for stream_id, summary in list(self.quality.streams.items()):
+                for direction, field in (
+                    ("uplink", uplink_field),
+                    ("downlink", downlink_field),
+                ):
+                    value = (summary[direction] or {}).get(field)
+                    if value is not None:
+                        result.append(
+                            ({"stream": stream_id, "direction": direction}, value)
+                        )
+            return result
+
+        return samples
+
+    def _connection_samples(self):
+        counts = {}
+        for conn in list(self.connections.values()):
+            role = conn.get("role") or "idle"
+            counts[role] = counts.get(role, 0) + 1
+        return [({"role": role}, count) for role, count in counts.items()]
+
+    def _listener_samples(self, attribute: str):
+        def samples():
+            return [
+                (
+                    {
+                        "stream": stream_id,
+                        "format": fmt,
+                        "listener": listener.remote,
+                        "id": str(listener.id),
+                    },
+                    getattr(listener, attribute),
+                )
+                for (stream_id, fmt), encoder in list(
+                    self.audio_server.encoders.items()
+                )
+                for listener in encoder.clients
+            ]
+
+        return samples
+
+    @property
+    def total_audio_bytes(self) -> int:
+        relayed = sum(child.value for child in BYTES_RELAYED.children.values())
+        written = sum(
+            listener.bytes_sent
+            for encoder in self.audio_server.encoders.values()
+            for listener in encoder.clients
+        )
+        return int(relayed + written)
+
+    async def metrics_handler(self, request):
+        """Provide Prometheus text metrics, or JSON with ?format=json"""
+        if request.query.get("format") == "json":
+            uptime = int(asyncio.get_event_loop().time() - self.start_time)
+            return web.json_response(
+                {
+                    "uptime_seconds": uptime,
+                    "active_connections": len(self.connections),
+                    "active_streams": len(self.active_streams),
+                    "total_audio_bytes": self.total_audio_bytes,
+                    "webrtc_available": True,
+                    "rtc_quality": list(self.quality.streams.values()),
+                    "receiver_lag": self.receiver_lag(),
+                }
+            )
+        return web.Response(
+            body=(REGISTRY.render() + self.metrics.render()).encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    async def debug_loop_handler(self, request):
+        """Event-loop lag and average synchronous time per hot path"""
+        sections = {}
+        for (section,), child in list(HOT_PATH_SECONDS.children.items()):
+            if child.count:
+                sections[section] = {
+                    "count": child.count,
+                    "avg_ms": round(child.sum / child.count * 1000, 3),
+                    "total_ms": round(child.sum * 1000, 1),
+                }
+        return web.json_response(
+            {"event_loop": self.loop_monitor.stats(), "hot_paths": sections}
+        )
+
+    async def debug_profile_handler(self, request):
+        """Sample the event-loop thread and return flamegraph-folded stacks"""
+        if request.remote not in LOCAL_ADDRESSES:
+            return web.Response(status=403, text="Profiling is only allowed locally")
+        try:
+            seconds = min(max(float(request.query.get("seconds", 10)), 0.1), 60.0)
+            hz = min(max(int(request.query.get("hz", 200)), 1), 1000)
+        except ValueError:
+            return web.Response(status=400, text="Invalid seconds or hz")
+
+        if self.profiler is None:
+            # Handlers run on the loop thread, which is the one we profile
+            self.profiler = SamplingProfiler(threading.get_ident())
+        # Taken on the loop before the executor starts, so a second request
+        # cannot slip in between the check and the profiler's own busy flag
+        if self.profile_lock.locked():
+            return web.Response(status=409, text="A profile is already running")
+
+        async with self.profile_lock:
+            self.profiler.hz = hz
+            logger.info(f"Profiling event loop for {seconds}s at {hz} Hz")
+            folded = await asyncio.get_event_loop().run_in_executor(
+                None, self.profiler.run, seconds
+            )
+        return web.Response(
+            text=folded,
+            content_type="text/plain",
+            headers={"Content-Disposition": "attachment; filename=profile.folded"},
         )
 
     async def health_check(self, request):
         uptime = int(asyncio.get_event_loop().time() - self.start_time)
         return web.json_response(
             {
-                "status": "healthy",
-                "webrtc_available": True,
+                "status": "draining" if self.draining else "healthy",
+                "ready": self.ready,
+                "webrtc_available": self.media_ready.is_set(),
                 "audio_server_running": self.audio_server is not None,
                 "active_streams": len(self.active_streams),
                 "connected_clients": len(self.connections),
@@ -59,40 +442,132 @@ class VoiceStreamingServer:
             }
         )
 
-    async def cleanup_stale_streams(self):
-        """Periodically clean up streams with no active receivers"""
-        while True:
-            try:
-                await asyncio.sleep(300)  # Run every 5 minutes
-                stale_streams = []
-
-                for stream_id, stream_info in self.active_streams.items():
-                    # Check if the track is ended
-                    track = stream_info.get("track")
-                    if track and track.readyState == "ended":
-                        stale_streams.append(stream_id)
-                        continue
-
-                    if not stream_info.get("receivers"):
-                        # Check if stream has been inactive for more than 10 minutes
-                        if not hasattr(stream_info, "last_activity"):
-                            stream_info["last_activity"] = (
-                                asyncio.get_event_loop().time()
-                            )
-                        elif (
-                            asyncio.get_event_loop().time()
-                            - stream_info["last_activity"]
-                            > 600
-                        ):
-                            stale_streams.append(stream_id)
-
-                for stream_id in stale_streams:
-                    logger.info(f"Cleaning up stale stream: {stream_id}")
-                    if stream_id in self.active_streams:
-                        del self.active_streams[stream_id]
+    async def ready_check(self, request):
+        """200 once signaling and the audio HTTP server are both serving"""
+        return web.json_response(
+            {"ready": self.ready, "startup_seconds": self.startup_seconds},
+            status=200 if self.ready else 503,
+        )
 
-            except Exception as e:
-                logger.error(f"Error in cleanup task: {e}")
+    async def drain_handler(self, request):
+        """Start drain mode; only accepted from this host"""
+        if request.remote not in LOCAL_ADDRESSES:
+            return web.Response(status=403, text="Drain is only allowed locally")
+        self.start_drain()
+        return web.json_response(
+            {"draining": True, "sessions": self.active_sessions()}, status=202
+        )
+
+    def active_sessions(self) -> int:
+        peers = sum(
+            1
+            for c in self.connections.values()
+            if c.get("pc") is not None
+            and c["pc"].connectionState not in ("closed", "failed")
+        )
+        return peers + self.audio_server.active_listeners()
+
+    def start_drain(self, handed_off: bool = False):
+        if handed_off:
+            # The successor writes the state file from now on
+            self.server_state = None
+        if not self.draining:
+            self.draining = True
+            asyncio.create_task(self.drain())
+
+    async def drain(self):
+        """Stop taking new sessions and let the current ones finish.
+
+        Every /ws client is told to reconnect after its own random delay, so a
+        successor (or this server, after a restart) is not hit all at once.
+        Sessions still running after ``drain_timeout`` are closed.
+        """
+        self.ready = False
+        if self.server_state is not None:
+            write_server_state(*self.server_state, ready=False)
+        logger.info(
+            f"Draining {self.active_sessions()} sessions "
+            f"(deadline {self.drain_timeout:.0f}s)"
+        )
+        if self.handoff is not None:
+            self.handoff.stop()
+        if self.site is not None:
+            await self.site.stop()
+            self.site = None
+        await self.audio_server.stop_listening()
+        await asyncio.gather(
+            *(self.send_reconnect(connection_id) for connection_id in self.connections)
+        )
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        while self.active_sessions() and loop.time() < deadline:
+            await asyncio.sleep(0.5)
+
+        remaining = self.active_sessions()
+        if remaining:
+            logger.info(f"Drain deadline passed, closing {remaining} sessions")
+        self.audio_server.end_listeners()
+        await asyncio.gather(
+            *(
+                connection["ws"].close(code=WSCloseCode.SERVICE_RESTART)
+                for connection in list(self.connections.values())
+            ),
+            return_exceptions=True,
+        )
+        self.stopped.set()
+
+    async def send_reconnect(self, connection_id: str):
+        connection = self.connections.get(connection_id)
+        if not connection:
+            return
+        delay_ms = int(random.uniform(0, self.drain_spread) * 1000)
+        try:
+            await asyncio.wait_for(
+                connection["ws"].send_str(
+                    json.dumps({"type": "reconnect", "delay_ms": delay_ms})
+                ),
+                timeout=self.broadcaster.send_timeout,
+            )
+        except Exception as e:
+            logger.debug(f"Could not send reconnect to {connection_id}: {e}")
+
+    def remove_stream(self, stream_id: str, record: StreamRecord = None):
+        """Forget a stream everywhere and tell clients it ended"""
+        if self.active_streams.remove(stream_id, record) is None:
+            return
+        if self.cluster:
+            self.cluster.unregister(stream_id)
+        self.broadcaster.announce("stream_ended", stream_id)
+        if stream_id != self.room_stream_id:
+            self.leave_room(stream_id)
+
+    def join_room(self, stream_id: str, track):
+        """Mix a sender into the room stream, publishing the room on first join"""
+        if not self.room_stream_id:
+            return
+        if self.room is None:
+            from room_mixer import MixerTrack
+
+            self.room = MixerTrack(self.relay, max_delay=self.room_max_delay)
+            self.active_streams.add(
+                StreamRecord(self.room_stream_id, self.room, mixed=True)
+            )
+            self.broadcaster.announce("stream_available", self.room_stream_id)
+        self.room.add_input(stream_id, track)
+
+    def leave_room(self, stream_id: str):
+        if self.room is None:
+            return
+        self.room.remove_input(stream_id)
+        if not self.room.inputs:
+            room, self.room = self.room, None
+            self.remove_stream(self.room_stream_id)
+            room.stop()
+
+    def expire_stream(self, record: StreamRecord):
+        logger.info(f"Cleaning up stale stream: {record.stream_id}")
+        self.remove_stream(record.stream_id, record)
 
     async def websocket_handler(self, request):
         ws = web.WebSocketResponse()
@@ -104,9 +579,14 @@ class VoiceStreamingServer:
             "pc": None,
             "role": None,
             "stream_id": None,
+            "level_streams": set(),
+            "quality_streams": set(),
+            "connected_at": asyncio.get_event_loop().time(),
         }
 
         try:
+            # Sockets are bound before aiortc is imported; hold early clients
+            await self.media_ready.wait()
             # Notify the client of available streams immediately
             await self.send_available_streams(connection_id)
 
@@ -114,7 +594,14 @@ class VoiceStreamingServer:
                 if msg.type == WSMsgType.TEXT:
                     try:
                         data = json.loads(msg.data)
+                        started = time.perf_counter()
                         await self.handle_message(connection_id, data)
+                        message_type = data.get("type")
+                        if message_type not in MESSAGE_TYPES:
+                            message_type = "other"
+                        MESSAGE_SECONDS.labels(message_type).observe(
+                            time.perf_counter() - started
+                        )
                     except json.JSONDecodeError:
                         logger.error(f"Invalid JSON received from {connection_id}")
                     except Exception as e:
@@ -141,19 +628,46 @@ class VoiceStreamingServer:
 
         logger.debug(f"Handling message {message_type} for {connection_id}")
 
-        if message_type == "start_sending":
+        if self.draining and message_type in ("start_sending", "start_receiving"):
+            await self.send_reconnect(connection_id)
+        elif message_type == "start_sending":
             await self.setup_sender(connection_id)
         elif message_type == "start_receiving":
-            await self.setup_receiver(connection_id, data.get("stream_id"))
+            await self.setup_receiver(
+                connection_id,
+                data.get("stream_id"),
+                latency=data.get("latency"),
+                max_delay_ms=data.get("max_delay_ms"),
+            )
         elif message_type == "webrtc_offer":
             await self.handle_webrtc_offer(connection_id, data)
         elif message_type == "webrtc_answer":
             await self.handle_webrtc_answer(connection_id, data)
         elif message_type == "get_available_streams":
             await self.send_available_streams(connection_id)
+        elif message_type == "subscribe_levels":
+            # Without a stream_id the client gets levels for every stream
+            connection["level_streams"].add(data.get("stream_id") or "*")
+        elif message_type == "unsubscribe_levels":
+            if data.get("stream_id"):
+                connection["level_streams"].discard(data["stream_id"])
+            else:
+                connection["level_streams"].clear()
+        elif message_type == "subscribe_quality":
+            connection["quality_streams"].add(data.get("stream_id") or "*")
+        elif message_type == "unsubscribe_quality":
+            if data.get("stream_id"):
+                connection["quality_streams"].discard(data["stream_id"])
+            else:
+                connection["quality_streams"].clear()
         elif message_type == "stop_stream":
             # Just stop media, keep WS open
             await self.stop_media(connection_id)
+        elif message_type == "set_room_gain":
+            gain = min(max(float(data.get("gain", 1.0)), 0.0), 4.0)
+            stream_id = data.get("stream_id")
+            if self.room is not None and self.room.set_gain(stream_id, gain):
+                logger.info(f"Room gain for {stream_id} set to {gain:.2f}")
 
     async def stop_media(self, connection_id: str):
         connection = self.connections.get(connection_id)
@@ -162,17 +676,21 @@ class VoiceStreamingServer:
             await connection["pc"].close()
             connection["pc"] = None
             connection["stream_id"] = None
+            connection.pop("track", None)
+            connection.pop("latency", None)
+            self.active_streams.remove_receiver(connection_id)
             # Do NOT remove from self.connections, keep WS open
 
     async def setup_sender(self, connection_id: str):
         """Set up a client as an audio sender"""
+        from relay_latency import LatencyTrack
+
         logger.info(f"Setting up sender for connection {connection_id}")
         connection = self.connections[connection_id]
         connection["role"] = "sender"
 
-        # Create RTCPeerConnection with LAN-only ICE configuration
-        config = RTCConfiguration(iceServers=[])
-        pc = RTCPeerConnection(configuration=config)
+        # LAN-only peer connection, pre-gathered when the pool has one ready
+        pc = self.peer_pool.acquire()
         connection["pc"] = pc
 
         @pc.on("track")
@@ -182,12 +700,18 @@ class VoiceStreamingServer:
 
                 # Store the audio stream
                 stream_id = f"stream_{connection_id}"
-                self.active_streams[stream_id] = {
-                    "track": track,
-                    "receivers": [],
-                    "sender_id": connection_id,
-                }
+                record = self.active_streams.add(
+                    StreamRecord(
+                        stream_id,
+                        track,
+                        sender_id=connection_id,
+                        passthrough=self.create_passthrough(stream_id, pc, track),
+                        vad=self.create_vad(),
+                    )
+                )
                 connection["stream_id"] = stream_id
+                if self.cluster:
+                    self.cluster.register(stream_id)
 
                 logger.info(f"Stored stream {stream_id} for sender {connection_id}")
 
@@ -196,15 +720,18 @@ class VoiceStreamingServer:
 
                 # Start visualization task
                 # Subscribe immediately to keep the track flowing
-                viz_track = self.relay.subscribe(track)
+                # Levels describe the present, so the meter never catches up
+                viz_track = LatencyTrack(self.relay, track, "live", 0.2)
                 asyncio.create_task(self.process_visualization(stream_id, viz_track))
+                self.audio_server.prewarm(stream_id, track)
+                self.audio_server.start_recording(stream_id, track)
+                self.audio_server.start_replay(stream_id, track)
+                self.join_room(stream_id, track)
 
                 @track.on("ended")
                 async def on_ended():
                     logger.info(f"Audio track ended for {connection_id}")
-                    if stream_id in self.active_streams:
-                        del self.active_streams[stream_id]
-                    await self.broadcast_stream_ended(stream_id)
+                    self.remove_stream(stream_id, record)
 
         @pc.on("iceconnectionstatechange")
         async def on_iceconnectionstatechange():
@@ -219,8 +746,36 @@ class VoiceStreamingServer:
             json.dumps({"type": "sender_ready", "connection_id": connection_id})
         )
 
-    async def setup_receiver(self, connection_id: str, stream_id: str = None):
+    def create_vad(self):
+        if not self.vad_gate:
+            return None
+        from audio_meter import VoiceActivityGate
+
+        return VoiceActivityGate(self.vad_threshold_db, self.vad_hangover)
+
+    def create_passthrough(self, stream_id: str, pc: "RTCPeerConnection", track):
+        """Tap the sender's encoded Opus so receivers can skip re-encoding"""
+        if not self.opus_passthrough:
+            return None
+        from opus_passthrough import OpusPassthrough
+
+        for receiver in pc.getReceivers():
+            if receiver.track is track:
+                passthrough = OpusPassthrough(stream_id, receiver)
+                if passthrough.attach():
+                    return passthrough
+        return None
+
+    async def setup_receiver(
+        self,
+        connection_id: str,
+        stream_id: str = None,
+        latency: str = None,
+        max_delay_ms: float = None,
+    ):
         """Set up a client as an audio receiver"""
+        from relay_latency import LATENCY_POLICIES, LatencyTrack
+
         try:
             connection = self.connections.get(connection_id)
             if not connection:
@@ -228,13 +783,24 @@ class VoiceStreamingServer:
 
             connection["role"] = "receiver"
 
+            latency = latency or self.receiver_latency
+            if latency not in LATENCY_POLICIES:
+                await connection["ws"].send_str(
+                    json.dumps(
+                        {"type": "error", "message": f"Unknown latency: {latency}"}
+                    )
+                )
+                return
+            max_delay = (
+                float(max_delay_ms) / 1000 if max_delay_ms else self.live_max_delay
+            )
+
             # If no specific stream requested, use the last available (newest)
-            if not stream_id and self.active_streams:
-                # Use list conversion to get the last key
-                stream_keys = list(self.active_streams.keys())
-                stream_id = stream_keys[-1]
+            if not stream_id:
+                stream_id = self.latest_stream_id()
 
-            if not stream_id or stream_id not in self.active_streams:
+            record = await self.ensure_stream(stream_id) if stream_id else None
+            if not record:
                 logger.warning(
                     f"No audio stream available for receiver {connection_id}"
                 )
@@ -245,31 +811,42 @@ class VoiceStreamingServer:
                 )
                 return
 
-            stream_info = self.active_streams[stream_id]
-            source_track = stream_info["track"]
+            source_track = record.track
 
             if source_track.readyState == "ended":
                 logger.warning(f"Stream {stream_id} track is ended, cannot receive")
-                del self.active_streams[stream_id]
+                self.remove_stream(stream_id, record)
                 await connection["ws"].send_str(
                     json.dumps({"type": "error", "message": "Stream ended"})
                 )
                 return
 
-            # Add this receiver to the stream list
-            if connection_id not in stream_info["receivers"]:
-                stream_info["receivers"].append(connection_id)
+            self.active_streams.add_receiver(stream_id, connection_id)
 
             connection["stream_id"] = stream_id
 
-            # Create RTCPeerConnection
-            config = RTCConfiguration(iceServers=[])
-            pc = RTCPeerConnection(configuration=config)
+            pc = self.peer_pool.acquire()
             connection["pc"] = pc
 
-            # Use MediaRelay to create a consumer track
-            relayed_track = self.relay.subscribe(source_track)
-            pc.addTrack(relayed_track)
+            # Forward the sender's encoded Opus when possible, otherwise use
+            # MediaRelay to create a consumer track that aiortc re-encodes
+            passthrough = record.passthrough
+            if passthrough is not None:
+                relayed_track = passthrough.subscribe(
+                    self.relay, source_track, policy=latency, max_delay=max_delay
+                )
+                relayed_track.on_first_frame = lambda: self.observe_first_audio(
+                    connection, "receiver"
+                )
+            else:
+                relayed_track = LatencyTrack(
+                    self.relay, source_track, latency, max_delay
+                )
+            relayed_track.count_relayed(
+                pc.addTrack(relayed_track), BYTES_RELAYED.labels(stream_id)
+            )
+            connection["track"] = relayed_track
+            connection["latency"] = latency
 
             @pc.on("iceconnectionstatechange")
             async def on_iceconnectionstatechange():
@@ -283,14 +860,14 @@ class VoiceStreamingServer:
             offer = await pc.createOffer()
             await pc.setLocalDescription(offer)
 
-            # Wait slightly longer for ICE gathering to be safe
-            await asyncio.sleep(1.0)
+            await self.wait_for_ice_gathering(pc)
 
             # Check if connection still exists and matches
             if self.connections.get(connection_id, {}).get("pc") != pc:
                 logger.warning(f"Connection {connection_id} reset during setup")
                 return
 
+            connection["offer_sent_at"] = asyncio.get_event_loop().time()
             await connection["ws"].send_str(
                 json.dumps(
                     {
@@ -321,7 +898,7 @@ class VoiceStreamingServer:
         if not connection:
             return
 
-        stream_list = list(self.active_streams.keys())
+        stream_list = self.available_stream_ids()
         try:
             await connection["ws"].send_str(
                 json.dumps({"type": "available_streams", "streams": stream_list})
@@ -329,21 +906,71 @@ class VoiceStreamingServer:
         except Exception as e:
             logger.error(f"Error sending available streams: {e}")
 
+    def available_stream_ids(self) -> list:
+        """Stream ids in publication order, including other workers' streams"""
+        if self.cluster:
+            # The room only mixes this worker's senders, so it stays local
+            stream_ids = self.cluster.stream_ids()
+            if self.room is not None:
+                stream_ids.append(self.room_stream_id)
+            return stream_ids
+        return self.active_streams.ids()
+
+    def latest_stream_id(self):
+        if self.cluster:
+            return self.cluster.latest_stream_id()
+        latest = self.active_streams.latest
+        return latest.stream_id if latest else None
+
+    async def ensure_stream(self, stream_id: str):
+        """Return the stream's record, attaching to another worker if it owns it"""
+        record = self.active_streams.get(stream_id)
+        if record or not self.cluster:
+            return record
+
+        track = await self.cluster.attach(stream_id)
+        if track is None:
+            return None
+        # Another request may have attached while we were connecting
+        if stream_id in self.active_streams:
+            track.stop()
+            return self.active_streams.get(stream_id)
+
+        record = self.active_streams.add(StreamRecord(stream_id, track, remote=True))
+
+        @track.on("ended")
+        def on_ended():
+            self.active_streams.remove(stream_id, record)
+
+        return record
+
     async def broadcast_stream_available(self, stream_id: str):
-        message = json.dumps({"type": "stream_available", "stream_id": stream_id})
-        for conn in self.connections.values():
-            try:
-                await conn["ws"].send_str(message)
-            except Exception:
-                pass
+        self.broadcaster.announce("stream_available", stream_id)
 
     async def broadcast_stream_ended(self, stream_id: str):
-        message = json.dumps({"type": "stream_ended", "stream_id": stream_id})
-        for conn in self.connections.values():
-            try:
-                await conn["ws"].send_str(message)
-            except Exception:
-                pass
+        self.broadcaster.announce("stream_ended", stream_id)
+
+    async def wait_for_ice_gathering(self, pc: "RTCPeerConnection"):
+        """Wait until ICE gathering completes, bounded by ICE_GATHER_TIMEOUT"""
+        if pc.iceGatheringState == "complete":
+            return
+
+        done = asyncio.get_event_loop().create_future()
+
+        def on_gathering_state_change():
+            if pc.iceGatheringState == "complete" and not done.done():
+                done.set_result(None)
+
+        pc.on("icegatheringstatechange", on_gathering_state_change)
+        try:
+            await asyncio.wait_for(done, timeout=self.ice_gather_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"ICE gathering not complete after {self.ice_gather_timeout}s, "
+                "sending description with candidates gathered so far"
+            )
+        finally:
+            pc.remove_listener("icegatheringstatechange", on_gathering_state_change)
 
     async def handle_webrtc_offer(self, connection_id: str, data: dict):
         # This handles offers FROM the client (Sender)
@@ -351,7 +978,10 @@ class VoiceStreamingServer:
         if not connection or not connection["pc"]:
             return
 
+        from aiortc import RTCSessionDescription
+
         pc = connection["pc"]
+        started = asyncio.get_event_loop().time()
         try:
             offer = RTCSessionDescription(
                 sdp=data["offer"]["sdp"], type=data["offer"]["type"]
@@ -361,9 +991,11 @@ class VoiceStreamingServer:
             answer = await pc.createAnswer()
             await pc.setLocalDescription(answer)
 
-            # Wait for ICE
-            await asyncio.sleep(1.0)
+            await self.wait_for_ice_gathering(pc)
 
+            OFFER_ANSWER_SECONDS.labels("sender").observe(
+                asyncio.get_event_loop().time() - started
+            )
             await connection["ws"].send_str(
                 json.dumps(
                     {
@@ -383,6 +1015,9 @@ class VoiceStreamingServer:
         connection = self.connections.get(connection_id)
         if not connection or not connection["pc"]:
             return
+        from aiortc import RTCSessionDescription
+
+        from opus_passthrough import PassthroughTrack, negotiated_opus
 
         pc = connection["pc"]
         try:
@@ -391,6 +1026,19 @@ class VoiceStreamingServer:
             )
             await pc.setRemoteDescription(answer)
             logger.info(f"Set remote description (answer) for {connection_id}")
+
+            offer_sent_at = connection.pop("offer_sent_at", None)
+            if offer_sent_at is not None:
+                OFFER_ANSWER_SECONDS.labels("receiver").observe(
+                    asyncio.get_event_loop().time() - offer_sent_at
+                )
+
+            for sender in pc.getSenders():
+                track = sender.track
+                if isinstance(track, PassthroughTrack) and not negotiated_opus(
+                    pc, track
+                ):
+                    track.use_transcoding()
         except Exception as e:
             logger.error(f"Error handling answer from {connection_id}: {e}")
 
@@ -401,18 +1049,11 @@ class VoiceStreamingServer:
 
             # If sender, remove stream
             if connection.get("role") == "sender" and connection.get("stream_id"):
-                stream_id = connection["stream_id"]
-                if stream_id in self.active_streams:
-                    del self.active_streams[stream_id]
-                await self.broadcast_stream_ended(stream_id)
-
-            # If receiver, remove from list
-            elif connection.get("role") == "receiver" and connection.get("stream_id"):
-                stream_id = connection["stream_id"]
-                if stream_id in self.active_streams:
-                    receivers = self.active_streams[stream_id].get("receivers", [])
-                    if connection_id in receivers:
-                        receivers.remove(connection_id)
+                self.remove_stream(connection["stream_id"])
+
+            # If receiver, remove from its stream
+            elif connection.get("role") == "receiver":
+                self.active_streams.remove_receiver(connection_id)
 
             if connection.get("pc"):
                 await connection["pc"].close()
@@ -421,19 +1062,41 @@ class VoiceStreamingServer:
 
     async def process_visualization(self, stream_id: str, track):
         """Keep the stream flowing and send viz data"""
+        from audio_meter import AudioMeter, frame_to_mono
+
+        record = self.active_streams.get(stream_id)
+        if record is None:
+            # Removed before the task got to run
+            track.stop()
+            return
         logger.info(f"Starting visualization task for {stream_id}")
-        frame_count = 0
+        meter = AudioMeter(rate_hz=self.levels_rate_hz)
+        frames_received = FRAMES_RECEIVED.labels(stream_id)
+        viz_seconds = HOT_PATH_SECONDS.labels("visualization")
+        sender = self.connections.get(record.sender_id)
+        vad = record.vad
         try:
-            while stream_id in self.active_streams:
+            while self.active_streams.get(stream_id) is record:
                 try:
                     # Pull frame to keep relay active
-                    _ = await asyncio.wait_for(track.recv(), timeout=2.0)
-
-                    frame_count += 1
-                    # Downsample viz data
-                    if frame_count % 5 == 0:
-                        # Processing logic...
-                        pass
+                    frame = await asyncio.wait_for(track.recv(), timeout=2.0)
+
+                    frames_received.inc()
+                    record.touch()
+                    if sender is not None:
+                        self.observe_first_audio(sender, "sender")
+                        sender = None
+
+                    started = time.perf_counter()
+                    samples = frame_to_mono(frame)
+                    levels = meter.add(frame, samples)
+                    vad_changed = vad is not None and vad.update(samples)
+                    viz_seconds.observe(time.perf_counter() - started)
+                    # Posted, not awaited: slow clients must not hold up metering
+                    if levels is not None:
+                        self.publish_levels(stream_id, levels)
+                    if vad_changed:
+                        self.publish_vad(stream_id, vad.active)
                 except asyncio.TimeoutError:
                     # Just continue, don't crash. Silence is okay.
                     continue
@@ -445,6 +1108,53 @@ class VoiceStreamingServer:
             logger.error(f"Visualization task error: {e}")
         finally:
             logger.info(f"Visualization task stopped for {stream_id}")
+            FRAMES_RECEIVED.remove(stream_id)
+            BYTES_RELAYED.remove(stream_id)
+
+    def observe_first_audio(self, connection: dict, role: str):
+        FIRST_AUDIO_SECONDS.labels(role).observe(
+            asyncio.get_event_loop().time() - connection["connected_at"]
+        )
+
+    def publish_levels(self, stream_id: str, levels: dict):
+        """Send a level/spectrum report to clients subscribed to this stream"""
+        targets = [
+            connection_id
+            for connection_id, conn in list(self.connections.items())
+            if stream_id in conn["level_streams"] or "*" in conn["level_streams"]
+        ]
+        if not targets:
+            return
+
+        message = json.dumps(
+            {"type": "audio_levels", "stream_id": stream_id, **levels},
+            separators=(",", ":"),
+        )
+        self.broadcaster.post(f"levels:{stream_id}", message, targets)
+
+    def publish_quality(self, streams: Dict[str, dict]):
+        """Send each stream's link quality summary to clients subscribed to it"""
+        for stream_id, summary in streams.items():
+            targets = [
+                connection_id
+                for connection_id, conn in list(self.connections.items())
+                if stream_id in conn["quality_streams"]
+                or "*" in conn["quality_streams"]
+            ]
+            if targets:
+                self.broadcaster.post(
+                    f"quality:{stream_id}",
+                    json.dumps({"type": "quality", **summary}),
+                    targets,
+                )
+
+    def publish_vad(self, stream_id: str, active: bool):
+        """Tell every client that a stream started or stopped carrying speech"""
+        logger.debug(f"Stream {stream_id} {'speaking' if active else 'silent'}")
+        self.broadcaster.post(
+            f"vad:{stream_id}",
+            json.dumps({"type": "vad", "stream_id": stream_id, "active": active}),
+        )
 
     async def ca_download_handler(self, request):
         """Serve the CA certificate if available."""
@@ -460,53 +1170,8 @@ class VoiceStreamingServer:
                 return web.FileResponse(path)
         return web.Response(status=404, text="CA Certificate not found")
 
-    async def run_server(self):
-        base_port = int(os.environ.get("PORT", 8080))
-        host = "0.0.0.0"
-
-        # Check for SSL certificates
-        ssl_context = None
-        cert_file = os.environ.get("SSL_CERT_FILE")
-        key_file = os.environ.get("SSL_KEY_FILE")
-
-        if cert_file and key_file:
-            if os.path.exists(cert_file) and os.path.exists(key_file):
-                try:
-                    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-                    ssl_context.load_cert_chain(cert_file, key_file)
-                    logger.info(f"SSL enabled using certificates from {cert_file}")
-                except Exception as e:
-                    logger.error(
-                        f"Failed to load SSL certificates from {cert_file}: {e}"
-                    )
-            else:
-                logger.warning(
-                    f"SSL keys defined but files not found: {cert_file}, {key_file}"
-                )
-
-        # Fallback to legacy hardcoded paths
-        if not ssl_context:
-            cert_locations = [
-                ("/ssl/fullchain.pem", "/ssl/privkey.pem"),
-                ("/config/ssl/fullchain.pem", "/config/ssl/privkey.pem"),
-            ]
-            for cert, key in cert_locations:
-                if os.path.exists(cert) and os.path.exists(key):
-                    try:
-                        ssl_context = ssl.create_default_context(
-                            ssl.Purpose.CLIENT_AUTH
-                        )
-                        ssl_context.load_cert_chain(cert, key)
-                        logger.info(
-                            f"SSL enabled using fallback certificates from {cert}"
-                        )
-                        break
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to load SSL certificates from {cert}: {e}"
-                        )
-
-        # Integrate Audio Server Routes
+    def setup_stream_routes(self):
+        """Integrate Audio Server Routes"""
         self.app.router.add_get(
             "/stream/latest.mp3", self.audio_server.latest_stream_handler
         )
@@ -514,69 +1179,206 @@ class VoiceStreamingServer:
             "/stream/{stream_id}.mp3", self.audio_server.stream_handler
         )
         self.app.router.add_get("/stream/status", self.audio_server.status_handler)
+        self.app.router.add_get(
+            "/stream/{stream_id}/index.m3u8", self.audio_server.hls_playlist_handler
+        )
+        self.app.router.add_get(
+            r"/stream/{stream_id}/{sequence:\d+}.aac",
+            self.audio_server.hls_segment_handler,
+        )
+        self.app.router.add_get(
+            "/stream/{stream_id}/replay.mp3", self.audio_server.replay_handler
+        )
+        self.app.router.add_get("/tap/{stream_id}", self.audio_server.tap_handler)
         self.app.router.add_get("/ca.crt", self.ca_download_handler)
         logger.info("Audio Stream Server routes merged into main application")
 
+    async def run_server(self, port: int = None, reuse_port: bool = False):
+        """Serve until cancelled.
+
+        With ``port`` set (cluster workers) the port is bound as-is, shared
+        through SO_REUSEPORT, and the supervisor picks it and first writes the
+        state file.
+
+        Both ports are bound before aiortc, PyAV and NumPy are imported, so
+        early clients queue instead of being refused. ``/ready`` and the
+        state file's ``ready`` flip once everything is serving.
+
+        A standalone server first asks a running one for its listening sockets
+        (see ``handoff.py``); that server then drains. Returns once drained.
+        """
+        started = time.perf_counter()
+        base_port = int(os.environ.get("PORT", 8080))
+        host = "0.0.0.0"
+
+        ssl_context = load_ssl_context()
+        self.setup_stream_routes()
+
+        if self.cluster:
+            await self.cluster.start()
+
         runner = web.AppRunner(self.app)
         await runner.setup()
 
-        # ── SMART PORT HUNTING ──
-        active_port = base_port
-        site = None
-        for i in range(10):  # Try up to 10 ports
-            try:
-                test_port = base_port + i
-                site = web.TCPSite(runner, host, test_port, ssl_context=ssl_context)
-                await site.start()
-                active_port = test_port
-                break
-            except OSError as e:
-                if "Address in use" in str(e) or e.errno == 98:
-                    logger.warning(
-                        f"Port {test_port} is busy, trying {test_port + 1}..."
-                    )
-                else:
-                    raise e
-
-        if not site:
-            logger.error(
-                f"Could not bind to any port in range {base_port}-{base_port + 10}"
-            )
-            return
+        loop = asyncio.get_running_loop()
+        inherited = {}
+        if port is None:
+            inherited = await loop.run_in_executor(None, take_over, handoff_path())
+            inherited = inherited or {}
+
+        sock = inherited.get("signaling")
+        if sock is not None:
+            active_port = sock.getsockname()[1]
+        elif port is not None:
+            sock = bind_socket(host, port, reuse_port=reuse_port)
+            active_port = port
+        else:
+            # ── SMART PORT HUNTING ──
+            active_port = base_port
+            for i in range(10):  # Try up to 10 ports
+                try:
+                    test_port = base_port + i
+                    sock = bind_socket(host, test_port)
+                    active_port = test_port
+                    break
+                except OSError as e:
+                    if "Address in use" in str(e) or e.errno == 98:
+                        logger.warning(
+                            f"Port {test_port} is busy, trying {test_port + 1}..."
+                        )
+                    else:
+                        raise e
 
-        # ── STATE PERSISTENCE ──
-        # Write the active port to a state file for the frontend to discover
-        try:
-            state_dir = "/config/www/voice_streaming_backend"
-            os.makedirs(state_dir, exist_ok=True)
-            with open(f"{state_dir}/server_state.json", "w") as f:
-                json.dump(
-                    {
-                        "active_port": active_port,
-                        "ssl": ssl_context is not None,
-                        "started_at": asyncio.get_event_loop().time(),
-                    },
-                    f,
+            if not sock:
+                logger.error(
+                    f"Could not bind to any port in range {base_port}-{base_port + 10}"
                 )
-            logger.info(f"Valid Server State written to {state_dir}/server_state.json")
-        except Exception as e:
-            logger.warning(f"Could not write server state: {e}")
+                return
 
-        self.cleanup_task = asyncio.create_task(self.cleanup_stale_streams())
-        protocol = "https/wss" if ssl_context else "http/ws"
-        logger.info(
-            f"✅ Server successfully started on {protocol}://{host}:{active_port}"
-        )
+        self.signaling_socket = sock
+        self.site = web.SockSite(runner, sock, ssl_context=ssl_context)
+        await self.site.start()
+        self.server_state = (active_port, ssl_context is not None)
+        if port is None:
+            write_server_state(*self.server_state, ready=False)
 
+        self.startup_seconds["listening"] = round(time.perf_counter() - started, 3)
         try:
             audio_port = int(os.environ.get("AUDIO_PORT", 8081))
             logger.info(f"Starting standalone Audio Stream HTTP server on port {audio_port}...")
-            await self.audio_server.start(host=host, port=audio_port)
+            await self.audio_server.start(
+                host=host,
+                port=audio_port,
+                reuse_port=reuse_port,
+                sock=inherited.get("audio"),
+            )
         except Exception as e:
             logger.error(f"Failed to start standalone Audio Stream server: {e}")
 
-        while True:
-            await asyncio.sleep(3600)
+        # Import the media stack off the loop so /health answers meanwhile
+        await loop.run_in_executor(None, import_media_modules)
+        self.load_media()
+        self.startup_seconds["media_loaded"] = round(time.perf_counter() - started, 3)
+
+        self.loop_monitor.start()
+        self.quality.start()
+        self.peer_pool.start()
+        protocol = "https/wss" if ssl_context else "http/ws"
+        if self.audio_server.site is not None:
+            self.ready = True
+            self.startup_seconds["ready"] = round(time.perf_counter() - started, 3)
+            write_server_state(*self.server_state, ready=True)
+        logger.info(
+            f"✅ Server successfully started on {protocol}://{host}:{active_port} "
+            f"(startup: {self.startup_seconds})"
+        )
+
+        if port is None:
+            # SIGTERM (add-on stop) and a successor taking our sockets both drain
+            loop.add_signal_handler(signal.SIGTERM, self.start_drain)
+            self.handoff = HandoffServer(
+                handoff_path(),
+                self.listening_sockets,
+                lambda: self.start_drain(handed_off=True),
+            )
+            self.handoff.start()
+
+        await self.stopped.wait()
+        self.quality.stop()
+        await self.peer_pool.stop()
+        await self.audio_server.stop()
+        await runner.cleanup()
+        logger.info("Drained, stopping")
+
+    def listening_sockets(self) -> dict:
+        sockets = {"signaling": self.signaling_socket}
+        if self.audio_server.sock is not None:
+            sockets["audio"] = self.audio_server.sock
+        return sockets
+
+
+def load_ssl_context():
+    """Build the server SSL context from SSL_CERT_FILE/SSL_KEY_FILE or /ssl"""
+    ssl_context = None
+    cert_file = os.environ.get("SSL_CERT_FILE")
+    key_file = os.environ.get("SSL_KEY_FILE")
+
+    if cert_file and key_file:
+        if os.path.exists(cert_file) and os.path.exists(key_file):
+            try:
+                ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                ssl_context.load_cert_chain(cert_file, key_file)
+                logger.info(f"SSL enabled using certificates from {cert_file}")
+            except Exception as e:
+                logger.error(f"Failed to load SSL certificates from {cert_file}: {e}")
+        else:
+            logger.warning(
+                f"SSL keys defined but files not found: {cert_file}, {key_file}"
+            )
+
+    # Fallback to legacy hardcoded paths
+    if not ssl_context:
+        cert_locations = [
+            ("/ssl/fullchain.pem", "/ssl/privkey.pem"),
+            ("/config/ssl/fullchain.pem", "/config/ssl/privkey.pem"),
+        ]
+        for cert, key in cert_locations:
+            if os.path.exists(cert) and os.path.exists(key):
+                try:
+                    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                    ssl_context.load_cert_chain(cert, key)
+                    logger.info(f"SSL enabled using fallback certificates from {cert}")
+                    break
+                except Exception as e:
+                    logger.error(f"Failed to load SSL certificates from {cert}: {e}")
+
+    return ssl_context
+
+
+def import_media_modules():
+    for name in MEDIA_MODULES:
+        importlib.import_module(name)
+
+
+def write_server_state(active_port: int, ssl_enabled: bool, ready: bool = False):
+    """Write the active port to a state file for the frontend to discover"""
+    # ── STATE PERSISTENCE ──
+    try:
+        state_dir = "/config/www/voice_streaming_backend"
+        os.makedirs(state_dir, exist_ok=True)
+        with open(f"{state_dir}/server_state.json", "w") as f:
+            json.dump(
+                {
+                    "active_port": active_port,
+                    "ssl": ssl_enabled,
+                    "ready": ready,
+                    "started_at": asyncio.get_event_loop().time(),
+                },
+                f,
+            )
+        logger.info(f"Valid Server State written to {state_dir}/server_state.json")
+    except Exception as e:
+        logger.warning(f"Could not write server state: {e}")
 
 
 if __name__ == "__main__":
@@ -585,8 +1387,23 @@ if __name__ == "__main__":
         level=getattr(logging, log_level, logging.INFO),
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
-    server = VoiceStreamingServer()
+    workers = int(os.environ.get("WORKERS", 1))
     try:
-        asyncio.run(server.run_server())
+        if workers > 1:
+            from cluster import supervise
+
+            asyncio.run(
+                supervise(
+                    workers,
+                    "0.0.0.0",
+                    int(os.environ.get("PORT", 8080)),
+                    on_port_selected=lambda port: write_server_state(
+                        port, load_ssl_context() is not None
+                    ),
+                )
+            )
+        else:
+            server = VoiceStreamingServer()
+            asyncio.run(server.run_server())
     except KeyboardInterrupt:
         logger.info("Stopped server")